@@ -0,0 +1,147 @@
+"""Solves many variants (scenarios) of the timetable at the same time and writes one table with the results
+
+Usage:
+    python batch.py scenarios.json results.csv [--workers 4] [--timeout 60]
+
+scenarios.json holds a list of scenarios, every key is optional:
+    {
+        "name": "strict, seed 3",      name of the scenario in the results (default: its position in the list)
+        "input": "input_data_real",    input module, or input file (json, yaml, csv directory or .npz, see timetable_input.py)
+        "seed": 3,                     seed of the random generators of the input module
+        "params": {"coverage": 50},    weights of the objective that are changed (see Timetable.params)
+        "extra_priority": {"0": 1},    extra priority of professors that is changed
+        "complete": true,              every required hour has to be taught (== instead of <=)
+        "sparse": true,
+        "backend": "glpk"
+    }
+The results are written as CSV, or as Parquet if the file ends with .parquet (needs pandas and pyarrow).
+A scenario that fails or goes over the timeout gets its status and error in the table, the others are not affected.
+"""
+import argparse
+import csv
+import importlib
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import time
+import traceback
+
+import timetable_input
+
+
+columns = ["name", "status", "objective", "gap", "solve_time", "total_time", "hours_taught", "required_hours", "coverage",
+           "preferred_days", "avoided_days", "preferred_hours", "avoided_hours", "error"]
+
+
+def load_input(source="input_data_real", seed=None):
+    """Loads an input file, or imports an input module running it again with the given seed for its random generators"""
+    if os.path.exists(source):
+        return timetable_input.load(source)
+    os.environ["TIMETABLE_SEED"] = str(0 if seed is None else seed)
+    return timetable_input.from_module(importlib.reload(importlib.import_module(source)))
+
+
+def run_scenario(scenario, time_limit=None):
+    """Builds and solves one scenario (runs in a worker process) and returns its row of the results
+
+    Errors are returned in the row instead of being raised."""
+    import main
+
+    started = time.perf_counter()
+    row = {"name": scenario["name"]}
+    try:
+        inp = load_input(scenario.get("input", "input_data_real"), scenario.get("seed"))
+        timetable = main.Timetable(inp, sparse=scenario.get("sparse", True), backend=scenario.get("backend", "glpk"),
+                                   complete=scenario.get("complete", False))
+        for name, weight in scenario.get("params", {}).items():
+            timetable.set_weight(name, weight)
+        for i, priority in scenario.get("extra_priority", {}).items():
+            timetable.set_priority(int(i), priority)
+
+        result = timetable.solve(time_limit=time_limit)
+        row.update(status=result.status, objective=result.objective, gap=result.gap, solve_time=result.time)
+        if timetable.solved:
+            row.update(timetable.statistics())
+    except Exception as e:
+        row.update(status="error", error="".join(traceback.format_exception_only(e)).strip())
+    row["total_time"] = time.perf_counter() - started
+    return row
+
+
+def scenario_process(scenario, time_limit, connection):
+    """Runs one scenario in its own process and sends its row back through connection"""
+    connection.send(run_scenario(scenario, time_limit))
+    connection.close()
+
+
+def run(scenarios, workers=None, timeout=None):
+    """Solves the scenarios in up to workers processes at a time and returns one row (dict) per scenario
+
+    timeout is the time limit (in seconds) of every solve. A scenario that is still running a minute after
+    its timeout (e.g. because it is stuck while building the model) is reported as "timeout" and its process
+    is killed, so it cannot keep the batch from finishing."""
+    scenarios = [dict(scenario, name=scenario.get("name", str(n))) for n, scenario in enumerate(scenarios)]
+    workers = os.cpu_count() if workers is None else workers
+    rows = [None]*len(scenarios)
+    waiting = list(range(len(scenarios)))
+    running = {} # Scenario number: (process, connection, deadline)
+
+    def finish(n, row):
+        process, connection, _ = running.pop(n)
+        process.join()
+        connection.close()
+        rows[n] = row
+        print(f"{scenarios[n]['name']}: {row['status']}")
+
+    try:
+        while waiting or running:
+            while waiting and len(running) < workers:
+                n = waiting.pop(0)
+                receiver, sender = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(target=scenario_process, args=(scenarios[n], timeout, sender))
+                process.start()
+                sender.close()
+                running[n] = (process, receiver, None if timeout is None else time.perf_counter() + timeout + 60)
+
+            multiprocessing.connection.wait([connection for _, connection, _ in running.values()], timeout=1)
+            for n, (process, connection, deadline) in list(running.items()):
+                if connection.poll():
+                    try:
+                        row = connection.recv()
+                    except EOFError: # The process died before sending its row (e.g. out of memory)
+                        row = {"name": scenarios[n]["name"], "status": "error", "error": f"Worker process died (exit code {process.exitcode})"}
+                    finish(n, row)
+                elif deadline is not None and time.perf_counter() > deadline:
+                    process.kill()
+                    finish(n, {"name": scenarios[n]["name"], "status": "timeout"})
+    finally:
+        for process, _, _ in running.values():
+            process.kill()
+    return rows
+
+
+def write_results(rows, path):
+    """Writes the rows to a CSV file, or to a Parquet file if path ends with .parquet"""
+    if path.endswith(".parquet"):
+        import pandas
+
+        pandas.DataFrame(rows, columns=columns).to_parquet(path, index=False)
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Solves many variants of the timetable at the same time")
+    parser.add_argument("scenarios", help="json file with the list of scenarios")
+    parser.add_argument("results", help="csv (or .parquet) file for the results")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: number of cores)")
+    parser.add_argument("--timeout", type=float, default=None, help="time limit of every scenario in seconds")
+    args = parser.parse_args()
+
+    with open(args.scenarios) as f:
+        scenarios = json.load(f)
+    write_results(run(scenarios, args.workers, args.timeout), args.results)
@@ -0,0 +1,325 @@
+"""Benchmarks for the Timetable model
+
+Usage:
+    python benchmark.py build       Time needed to build the model on synthetic inputs of increasing size
+    python benchmark.py backends    Solve time and objective of every solver backend on the bundled inputs
+    python benchmark.py components  Solve time of several schools scheduled together, as one model and one component per process
+    python benchmark.py scaling [results.json]      Build and solve statistics of synthetic inputs, scaling professors,
+                                                    classes, days and hours one at a time, written to results.json
+    python benchmark.py compare old.json new.json   Compares two results files of scaling (e.g. of two commits)
+    python benchmark.py symmetry [backend]          Solve time of schools with identical sections, without and with symmetry breaking
+    python benchmark.py formulation [backend]       LP bound and solve time of the plain and the strong (strong=True) model
+    python benchmark.py lns [time_limit]            Objective and time of the whole model and of lns.py on synthetic inputs
+    python benchmark.py twostage [time_limit]       Model size, objective and time of the whole model and of twostage.py
+"""
+import importlib
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import main
+import decompose
+import input_data_synthetic
+import lns
+import solvers
+import twostage
+
+
+# (professors, classes) of each synthetic input, with 5 days and 6 hours per day
+sizes = [(19, 3), (40, 8), (80, 16), (160, 32)]
+
+# The input modules that come with the project
+input_modules = ["input_data", "input_data_non_complete", "input_data_real"]
+
+
+def build_time(number_of_professors, number_of_classes, sparse=True, repeat=3):
+    """Returns the best time (in seconds) needed to build the model and the number of variables and rows"""
+    inp = input_data_synthetic.generate(number_of_professors, number_of_classes)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        timetable = main.Timetable(inp, sparse=sparse)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(timetable.keys), timetable.number_of_rows
+
+
+def solve_time(module_name, backend):
+    """Returns the time (in seconds) needed to build and solve the model of an input module and the objective value"""
+    inp = importlib.import_module(module_name)
+    start = time.perf_counter()
+    timetable = main.Timetable(inp, backend=backend)
+    timetable.solve()
+    elapsed = time.perf_counter() - start
+    return elapsed, timetable.objective_value()
+
+
+def benchmark_build():
+    print("Profs\tClasses\tMode\tVariables\tRows\tBuild time (s)")
+    for number_of_professors, number_of_classes in sizes:
+        for sparse in (False, True):
+            elapsed, variables, rows = build_time(number_of_professors, number_of_classes, sparse)
+            print(f"{number_of_professors}\t{number_of_classes}\t{'sparse' if sparse else 'dense'}\t{variables}\t\t{rows}\t{elapsed:.3f}")
+
+
+def benchmark_backends():
+    results = []
+    for module_name in input_modules:
+        for backend in solvers.backends:
+            try:
+                elapsed, objective = solve_time(module_name, backend)
+            except ImportError as e: # The solver of the backend is not installed
+                print(f"Skipping {backend}: {e}")
+                continue
+            results.append((module_name, backend, elapsed, objective))
+
+    # The solvers print their own logs, so the results are printed at the end
+    print("\nInput\t\t\tBackend\tTime (s)\tObjective")
+    for module_name, backend, elapsed, objective in results:
+        print(f"{module_name:<24}{backend}\t{elapsed:.3f}\t\t{objective:.1f}")
+
+
+# (schools, professors per school, classes per school) of the multi-school inputs
+school_sizes = [(2, 19, 3), (4, 19, 3), (8, 19, 3)]
+
+
+def benchmark_components(workers=None):
+    results = []
+    for number_of_schools, number_of_professors, number_of_classes in school_sizes:
+        inp = input_data_synthetic.generate_schools(number_of_schools, number_of_professors, number_of_classes)
+        start = time.perf_counter()
+        timetable = main.Timetable(inp)
+        timetable.solve()
+        whole = time.perf_counter() - start, timetable.objective_value()
+
+        start = time.perf_counter()
+        timetable = main.Timetable(inp)
+        decompose.solve(timetable, workers=workers)
+        parts = time.perf_counter() - start, timetable.objective_value()
+        results.append((number_of_schools, whole, parts))
+
+    print("\nSchools\tWhole (s)\tComponents (s)\tSpeedup\tObjective (whole / components)")
+    for number_of_schools, (whole_time, whole_objective), (parts_time, parts_objective) in results:
+        print(f"{number_of_schools}\t{whole_time:.3f}\t\t{parts_time:.3f}\t\t{whole_time/parts_time:.2f}\t{whole_objective:.1f} / {parts_objective:.1f}")
+
+
+# (professors, grades, sections per grade) of the inputs with identical classes
+symmetry_sizes = [(19, 2, 3), (19, 3, 2), (25, 3, 3), (30, 4, 2)]
+symmetry_time_limit = 120 # seconds per solve
+
+
+def benchmark_symmetry(backend="glpk"):
+    """Solves complete timetables of schools whose grades have identical sections, with the plain model and with symmetry=True"""
+    results = []
+    for number_of_professors, number_of_grades, sections in symmetry_sizes:
+        inp = input_data_synthetic.generate_sections(number_of_professors, number_of_grades, sections)
+        for use_symmetry in (False, True):
+            timetable = main.Timetable(inp, complete=True, backend=backend, symmetry=use_symmetry)
+            result = timetable.solve(time_limit=symmetry_time_limit)
+            results.append((number_of_professors, number_of_grades, sections, use_symmetry, len(timetable.symmetry_rows), result))
+
+    print("\nProfs\tGrades\tSections\tModel\t\tRows added\tStatus\t\tTime (s)\tObjective")
+    for number_of_professors, number_of_grades, sections, use_symmetry, rows, result in results:
+        objective = "-" if result.objective is None else f"{result.objective:.1f}"
+        print(f"{number_of_professors}\t{number_of_grades}\t{sections}\t\t{'symmetry' if use_symmetry else 'plain':<8}\t{rows}\t\t"
+              f"{result.status:<8}\t{result.time:.2f}\t\t{objective}")
+
+
+def formulation_inputs():
+    """Returns (name, input, complete) of the inputs of the formulation benchmark"""
+    inputs = [(module_name, importlib.import_module(module_name), False) for module_name in ["input_data", "input_data_real"]]
+    inputs.append(("input_data_real complete", importlib.import_module("input_data_real"), True))
+    for number_of_professors, number_of_classes in sizes[:2]:
+        inputs.append((f"synthetic {number_of_professors}x{number_of_classes}",
+                       input_data_synthetic.generate(number_of_professors, number_of_classes), False))
+    for number_of_professors, number_of_grades, sections in symmetry_sizes[1:3]:
+        inputs.append((f"sections {number_of_professors}x{number_of_grades}x{sections} complete",
+                       input_data_synthetic.generate_sections(number_of_professors, number_of_grades, sections), True))
+    return inputs
+
+
+def lp_bound(timetable):
+    """The objective of the LP relaxation of the model (the bound the branch and bound starts from), None without scipy"""
+    try:
+        from scipy.optimize import linprog
+        from scipy.sparse import coo_matrix, vstack
+    except ImportError:
+        return None
+    rows, cols, vals, lower, upper = timetable.constraint_matrix()
+    matrix = coo_matrix((vals, (rows, cols)), shape=(timetable.number_of_rows, len(timetable.keys))).tocsr()
+    finite_upper, finite_lower = np.isfinite(upper), np.isfinite(lower)
+    result = linprog(-timetable.objective, A_ub=vstack([matrix[finite_upper], -matrix[finite_lower]]),
+                     b_ub=np.concatenate([upper[finite_upper], -lower[finite_lower]]),
+                     bounds=np.stack([np.zeros(len(timetable.upper)), timetable.upper], axis=1), method="highs")
+    return -result.fun if result.status == 0 else None
+
+
+def benchmark_formulation(backend="glpk"):
+    """Builds every input with the plain and the strong model and compares the size, the LP bound and the solve time"""
+    results = []
+    for name, inp, complete in formulation_inputs():
+        for strong in (False, True):
+            timetable = main.Timetable(inp, complete=complete, backend=backend, strong=strong)
+            bound = lp_bound(timetable)
+            result = timetable.solve(time_limit=symmetry_time_limit)
+            results.append((name, strong, timetable.number_of_rows, bound, result))
+
+    print("\nInput\t\t\t\tModel\tRows\tLP bound\tStatus\t\tTime (s)\tObjective")
+    for name, strong, rows, bound, result in results:
+        bound = "-" if bound is None else f"{bound:.1f}"
+        objective = "-" if result.objective is None else f"{result.objective:.1f}"
+        print(f"{name:<32}{'strong' if strong else 'plain'}\t{rows}\t{bound}\t\t{result.status:<8}\t{result.time:.2f}\t\t{objective}")
+
+
+def benchmark_lns(time_limit=60):
+    """Solves synthetic inputs of increasing size with the whole model and with lns.solve, both with time_limit"""
+    results = []
+    for number_of_professors, number_of_classes in sizes:
+        inp = input_data_synthetic.generate(number_of_professors, number_of_classes)
+        timetable = main.Timetable(inp)
+        whole = timetable.solve(time_limit=time_limit)
+        timetable = main.Timetable(inp, build=False)
+        search = lns.solve(timetable, time_limit=time_limit)
+        results.append((number_of_professors, number_of_classes, whole, search))
+
+    print("\nProfs\tClasses\tWhole model\t\t\t\tLNS")
+    for number_of_professors, number_of_classes, whole, search in results:
+        objective = "-" if whole.objective is None else f"{whole.objective:.1f}"
+        print(f"{number_of_professors}\t{number_of_classes}\t{whole.status:<8} {objective}\t{whole.time:.2f}s\t\t{search.objective:.1f}\t{search.time:.2f}s")
+
+
+def benchmark_twostage(time_limit=60):
+    """Solves synthetic inputs and schools with identical sections (complete) with the whole model, with time_limit,
+    and with twostage.solve"""
+    inputs = [(f"synthetic {p}x{c}", input_data_synthetic.generate(p, c), False) for p, c in sizes]
+    inputs += [(f"sections {p}x{c}x{s}", input_data_synthetic.generate_sections(p, c, s), True) for p, c, s in symmetry_sizes[1:3]]
+    results = []
+    for name, inp, complete in inputs:
+        timetable = main.Timetable(inp, complete=complete)
+        whole = timetable.solve(time_limit=time_limit)
+        timetable = main.Timetable(inp, complete=complete, build=False)
+        stages = twostage.solve(timetable)
+        results.append((name, len(timetable.keys), len(twostage.DayModel(inp, timetable.params, timetable.extra_priority).keys), whole, stages))
+
+    print("\nInput\t\t\tVariables\tStage one\tWhole model\t\t\tTwo stages")
+    for name, variables, stage_one, whole, stages in results:
+        objectives = ["-" if result.objective is None else f"{result.objective:.1f}" for result in (whole, stages)]
+        print(f"{name:<24}{variables}\t\t{stage_one}\t\t{whole.status:<8} {objectives[0]}\t{whole.time:.2f}s\t\t"
+              f"{stages.status:<8} {objectives[1]}\t{stages.time:.2f}s")
+
+
+# Every axis is scaled on its own, starting from the size of input_data_real.py: (professors, classes, days, hours)
+base_size = (19, 3, 5, 6)
+scaling_axes = {
+    "professors": [19, 40, 80, 160],
+    "classes": [3, 6, 12, 24],
+    "days": [5, 6, 7],
+    "hours": [6, 8, 10, 12],
+}
+scaling_time_limit = 60 # seconds per solve
+
+
+def scaling_sizes():
+    """Returns the (axis, professors, classes, days, hours) of every input of the scaling benchmark"""
+    sizes = []
+    for n, (axis, values) in enumerate(scaling_axes.items()):
+        for value in values:
+            size = list(base_size)
+            size[n] = value
+            sizes.append((axis, *size))
+    return sizes
+
+
+def measure(number_of_professors, number_of_classes, number_of_days, number_of_hours, backend="glpk", time_limit=scaling_time_limit):
+    """Builds and solves one synthetic input and returns its statistics (runs in a new process, for the peak memory)"""
+    inp = input_data_synthetic.generate(number_of_professors, number_of_classes, number_of_days, number_of_hours)
+    start = time.perf_counter()
+    timetable = main.Timetable(inp, backend=backend)
+    build = time.perf_counter() - start
+    result = timetable.solve(time_limit=time_limit)
+
+    try:
+        import resource
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024 # kilobytes on Linux
+    except ImportError: # Not available on Windows
+        peak_rss_mb = None
+    return {
+        "variables": len(timetable.keys),
+        "constraints": timetable.number_of_rows,
+        "nonzeros": len(timetable.constraint_matrix()[0]),
+        "build_time": build,
+        "solve_time": result.time,
+        "status": result.status,
+        "objective": result.objective,
+        "gap": result.gap,
+        "coverage": timetable.statistics()["coverage"] if timetable.solved else None,
+        "peak_rss_mb": peak_rss_mb,
+    }
+
+
+def benchmark_scaling(path="benchmark_results.json", backend="glpk"):
+    # Every input is measured in a new process, so that the peak memory is only the memory of that input
+    context = multiprocessing.get_context("spawn")
+    records = []
+    for axis, *size in scaling_sizes():
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            record = executor.submit(measure, *size, backend=backend).result()
+        records.append(dict(zip(["axis", "professors", "classes", "days", "hours"], [axis, *size]), **record))
+        print(f"{axis}: {size} built in {record['build_time']:.3f}s, solved in {record['solve_time']:.3f}s ({record['status']})")
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    with open(path, "w") as f:
+        json.dump({"commit": commit, "date": time.strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(),
+                   "machine": platform.machine(), "backend": backend, "time_limit": scaling_time_limit, "results": records}, f, indent=1)
+    print(f"Results written to {path}")
+
+
+def compare_scaling(old_path, new_path):
+    """Prints the ratio new/old of the times and the memory of every input found in both files"""
+    with open(old_path) as f:
+        old = {tuple(record[key] for key in ["professors", "classes", "days", "hours"]): record for record in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+
+    print("P\tC\tD\tH\tBuild\tSolve\tMemory\tObjective (old -> new)")
+    for record in new:
+        size = tuple(record[key] for key in ["professors", "classes", "days", "hours"])
+        if size not in old:
+            continue
+        ratios = []
+        for key in ["build_time", "solve_time", "peak_rss_mb"]:
+            ratios.append(f"{record[key]/old[size][key]:.2f}x" if record[key] and old[size][key] else "-")
+        print("\t".join(str(value) for value in size) + "\t" + "\t".join(ratios) + f"\t{old[size]['objective']} -> {record['objective']}")
+
+
+if __name__ == '__main__':
+    mode = sys.argv[1] if len(sys.argv) > 1 else "build"
+    if mode == "build":
+        benchmark_build()
+    elif mode == "backends":
+        benchmark_backends()
+    elif mode == "components":
+        benchmark_components()
+    elif mode == "scaling":
+        benchmark_scaling(*sys.argv[2:3])
+    elif mode == "symmetry":
+        benchmark_symmetry(*sys.argv[2:3])
+    elif mode == "formulation":
+        benchmark_formulation(*sys.argv[2:3])
+    elif mode == "lns":
+        benchmark_lns(*map(float, sys.argv[2:3]))
+    elif mode == "twostage":
+        benchmark_twostage(*map(float, sys.argv[2:3]))
+    elif mode == "compare" and len(sys.argv) == 4:
+        compare_scaling(sys.argv[2], sys.argv[3])
+    else:
+        print(__doc__)
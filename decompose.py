@@ -0,0 +1,134 @@
+"""Solves a timetable as independent parts
+
+Professors that share no class, and classes that share no professor, are not linked by any constraint
+(e.g. when several schools are scheduled together). Each connected component of the professor-class graph
+(a professor and a class are connected if the professor has required hours for the class) is built and
+solved as its own Timetable in a separate process, and the timetables are merged back into one.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import solvers
+import timetable_input
+
+
+def components(required_hours_per_professor_per_class):
+    """Returns the connected components of the professor-class graph as a list of (professors, classes)
+
+    Professors without required hours and classes without professors are left out, they have nothing to schedule."""
+    required_hours = np.array(required_hours_per_professor_per_class) > 0
+    professor_component = np.full(required_hours.shape[0], -1)
+    class_component = np.full(required_hours.shape[1], -1)
+    result = []
+    for first in range(required_hours.shape[0]):
+        if professor_component[first] != -1 or not required_hours[first].any():
+            continue
+        # Breadth first search, alternating between professors and classes
+        professors, classes = [first], []
+        professor_component[first] = len(result)
+        new_professors = [first]
+        while new_professors:
+            new_classes = np.flatnonzero(required_hours[new_professors].any(axis=0) & (class_component == -1))
+            class_component[new_classes] = len(result)
+            new_professors = np.flatnonzero(required_hours[:, new_classes].any(axis=1) & (professor_component == -1)).tolist()
+            professor_component[new_professors] = len(result)
+            professors += new_professors
+            classes += new_classes.tolist()
+        result.append((sorted(professors), sorted(classes)))
+    return result
+
+
+def component_input(inp, professors, classes):
+    """Returns the part of the input inp with only the professors and classes given, renumbered from 0"""
+    def per_professor(values):
+        return [values[i] for i in professors]
+
+    return timetable_input.TimetableInput(
+        [inp.class_names[c] for c in classes], inp.days_initials, inp.number_of_hours,
+        inp.required_hours_per_professor_per_class[np.ix_(professors, classes)],
+        inp.max_hours_per_professor_per_class_per_day[np.ix_(professors, classes)],
+        inp.available[professors],
+        *[per_professor(getattr(inp, name)) for name in timetable_input.preference_fields],
+        per_professor(inp.professor_names))
+
+
+def solve_component(inp, options, params, extra_priority, solve_options):
+    """Builds and solves the Timetable of one component (runs in a worker process)
+
+    Returns the SolveResult, without the values, and the assignments (i, d, h, c) with the numbering of the component."""
+    import main
+
+    timetable = main.Timetable(inp, params=params, extra_priority=extra_priority, **options)
+    result = timetable.solve(**solve_options)
+    assignments = timetable.assignments() if timetable.solved else []
+    result.values = None
+    return result, assignments
+
+
+def merge_results(results, elapsed):
+    """Combines the SolveResults of the components into the result of the whole timetable"""
+    for status in ("infeasible", "no solution", "feasible"): # The worst status of the components
+        if any(result.status == status for result in results):
+            break
+    else:
+        status = "optimal"
+    if status in ("infeasible", "no solution"):
+        return solvers.SolveResult(status, time=elapsed)
+    return solvers.SolveResult(status, sum(result.objective for result in results),
+                               max((result.gap or 0.0 for result in results), default=0.0), elapsed)
+
+
+def solve(timetable, workers=None, time_limit=None, mip_gap=None, node_limit=None, start=None):
+    """Solves the timetable one component at a time, in up to workers processes
+
+    The merged solution is stored in the timetable, so assignments(), objective_value() and the print methods work
+    as after Timetable.solve(). start is split between the components, the other options are given to every one.
+    Returns the merged solvers.SolveResult."""
+    started = time.perf_counter()
+    if isinstance(start, str):
+        import main
+        start = main.load_timetable(start)
+    if timetable.backend is None: # Only the variables are needed to merge the solutions, not the whole model
+        timetable.presolve()
+        timetable.create_timetable()
+        timetable.create_unavailable_hours_constraints()
+        timetable.set_objective()
+    inp = timetable.inp
+    parts = components(inp.required_hours_per_professor_per_class)
+    options = {"sparse": timetable.sparse, "backend": timetable.backend_name, "complete": timetable.complete,
+               "symmetry": timetable.symmetry, "strong": timetable.strong}
+    tasks = []
+    for professors, classes in parts:
+        solve_options = {"time_limit": time_limit, "mip_gap": mip_gap, "node_limit": node_limit}
+        if start is not None:
+            professor_index = {i: n for n, i in enumerate(professors)}
+            class_index = {c: n for n, c in enumerate(classes)}
+            solve_options["start"] = [(professor_index[i], d, h, class_index[c]) for i, d, h, c in start
+                                      if i in professor_index and c in class_index]
+        tasks.append((component_input(inp, professors, classes), options, timetable.params,
+                      [timetable.extra_priority[i] for i in professors], solve_options))
+
+    if len(tasks) <= 1 or workers == 1: # No need for other processes
+        outputs = [solve_component(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            outputs = list(executor.map(solve_component, *zip(*tasks)))
+
+    # The assignments of every component are numbered back as in the whole timetable
+    values = np.zeros(len(timetable.keys))
+    for (professors, classes), (_, assignments) in zip(parts, outputs):
+        for i, d, h, c in assignments:
+            j = timetable.column((professors[i], d, h, classes[c]))
+            if j is None:
+                raise ValueError(f"Assignment {(professors[i], d, h, classes[c])} of a component has no variable in the timetable")
+            values[j] = 1
+
+    timetable.result = merge_results([result for result, _ in outputs], time.perf_counter() - started)
+    if timetable.result.status in ("optimal", "feasible"):
+        timetable.result.values = values
+        timetable.set_solution(timetable.keys[values > 0.5])
+    else:
+        timetable.set_solution(None)
+    return timetable.result
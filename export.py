@@ -0,0 +1,130 @@
+"""Writes a solved timetable to files that other programs can read
+
+Every format is written from the same rows (one per lesson: professor, class, day, hour), which are produced
+one at a time by a generator and written as they come, so a big timetable is never held as one string.
+
+    export.write_csv(timetable, "timetable.csv")
+    export.write_jsonl(timetable, "timetable.jsonl")
+    export.write_parquet(timetable, "timetable.parquet")     # needs pyarrow
+    export.write_icalendar(timetable, "calendars")           # one .ics file per professor and per class
+    timetable.show_stats("stats.png")                        # the charts of show_stats, without opening a window
+"""
+import csv
+import datetime
+import json
+import os
+import re
+
+import numpy as np
+
+columns = ["professor", "class", "class_name", "day", "day_name", "hour"]
+
+
+def rows(timetable, by="professor"):
+    """Yields one dict per lesson of the solution of timetable
+
+    The lessons are ordered by professor, day, hour and class, or with by="class" by class, day, hour and professor."""
+    if not timetable.solved:
+        raise ValueError("Model has not been solved yet")
+    # The solution is not in this order once the model was edited (columns added at the end of the model)
+    i, d, h, c = timetable.solution.T
+    solution = timetable.solution[np.lexsort((i, h, d, c)) if by == "class" else np.lexsort((c, h, d, i))]
+    for i, d, h, c in solution.tolist():
+        yield {"professor": i, "class": c, "class_name": timetable.inp.class_names[c],
+               "day": d, "day_name": timetable.inp.days_initials[d], "hour": h}
+
+
+def write_csv(timetable, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows(timetable))
+
+
+def write_jsonl(timetable, path):
+    """Writes one json object per line and per lesson"""
+    with open(path, "w") as f:
+        for row in rows(timetable):
+            f.write(json.dumps(row) + "\n")
+
+
+def batches(iterable, size):
+    """Groups the items of iterable into lists of up to size items"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_parquet(timetable, path, batch_size=65536):
+    """Writes the lessons to a Parquet file, batch_size rows at a time (needs the pyarrow package)"""
+    import pyarrow
+    import pyarrow.parquet
+
+    schema = pyarrow.schema([("professor", pyarrow.int32()), ("class", pyarrow.int32()), ("class_name", pyarrow.string()),
+                             ("day", pyarrow.int32()), ("day_name", pyarrow.string()), ("hour", pyarrow.int32())])
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for batch in batches(rows(timetable), batch_size):
+            writer.write_batch(pyarrow.RecordBatch.from_pylist(batch, schema=schema))
+
+
+def file_name(name):
+    """Returns name with only letters, digits, "-", "_" and "." (not at the start), so it stays inside the directory"""
+    return re.sub(r"[^\w\-.]", "_", name).lstrip(".") or "_"
+
+
+def write_icalendar(timetable, directory, first_day=None, first_hour=datetime.time(8, 0), lesson_minutes=45, break_minutes=15):
+    """Writes a calendar (.ics) with the weekly lessons of every professor and of every class to directory
+
+    The lessons repeat every week, starting from the week of first_day (the Monday of the current week by default).
+    Hour h of a day starts at first_hour + h*(lesson_minutes + break_minutes)."""
+    if first_day is None:
+        today = datetime.date.today()
+        first_day = today - datetime.timedelta(days=today.weekday())
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    # The rows come ordered by professor (or class), so the calendars are written one after the other
+    for kind, number in [("professor", timetable.number_of_profs), ("class", timetable.number_of_classes)]:
+        lessons = rows(timetable, by=kind)
+        row = next(lessons, None)
+        names = timetable.inp.professor_names if kind == "professor" else timetable.inp.class_names
+        used = set()
+        for index in range(number):
+            name = names[index]
+            path = f"{kind}_{file_name(name)}"
+            if path in used: # Two names that differ only in the characters that were replaced
+                path += f"_{index}"
+            used.add(path)
+            with open(os.path.join(directory, path + ".ics"), "w", newline="") as f:
+                write_lines(f, ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//High School Timetable//EN",
+                                f"X-WR-CALNAME:{kind.capitalize()} {name}"])
+                while row is not None and row[kind] == index:
+                    write_lines(f, event(row, first_day, first_hour, lesson_minutes, break_minutes, stamp))
+                    row = next(lessons, None)
+                write_lines(f, ["END:VCALENDAR"])
+
+
+def event(row, first_day, first_hour, lesson_minutes, break_minutes, stamp):
+    """Returns the lines of the weekly event of a lesson"""
+    start = datetime.datetime.combine(first_day + datetime.timedelta(days=row["day"]), first_hour)
+    start += datetime.timedelta(minutes=row["hour"]*(lesson_minutes + break_minutes))
+    end = start + datetime.timedelta(minutes=lesson_minutes)
+    return ["BEGIN:VEVENT",
+            f"UID:{row['professor']}-{row['day']}-{row['hour']}-{row['class']}@high-school-timetable",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{start:%Y%m%dT%H%M%S}",
+            f"DTEND:{end:%Y%m%dT%H%M%S}",
+            "RRULE:FREQ=WEEKLY",
+            f"SUMMARY:Class {row['class_name']} - Professor {row['professor']}",
+            "END:VEVENT"]
+
+
+def write_lines(f, lines):
+    """Writes lines with the CRLF line endings of iCalendar"""
+    for line in lines:
+        f.write(line + "\r\n")
@@ -0,0 +1,236 @@
+"""Finds a good timetable fast without the MIP solver: a greedy timetable improved by simulated annealing
+
+The timetable always respects the constraints of the model (one class per professor and one professor per class
+at a time, the required hours, the hours per day and the unavailable hours) and the search improves the same
+objective as Timetable.set_objective, but it is not proven optimal.
+
+    result = heuristic.solve(timetable, time_limit=0.5)
+    timetable.print_stats()                                          # the reports work as after Timetable.solve
+    timetable.solve(start=timetable.assignments(), time_limit=60)     # the MIP can continue from it
+
+The state of the search is kept in flat arrays indexed like the rows of the model (professor slot, class slot,
+professor and class, professor, day and class), so checking and applying a move only touches a few entries.
+"""
+import math
+import random
+import time
+
+import numpy as np
+
+import profiling
+import solvers
+
+
+class LocalSearch:
+    """The lessons of a timetable with the counts of every constraint, changed one lesson at a time"""
+
+    def __init__(self, timetable, seed=0):
+        D, H, C = timetable.number_of_days, timetable.number_of_hours, timetable.number_of_classes
+        i, d, h, c = timetable.keys.T
+        self.professor_slot = ((i*D + d)*H + h).tolist() # Same groups as the families of the model
+        self.class_slot = ((d*H + h)*C + c).tolist()
+        self.pair = (i*C + c).tolist()
+        self.day = ((i*D + d)*C + c).tolist()
+        self.objective = timetable.objective.tolist()
+        self.usable = (timetable.upper > 0).tolist()
+        self.number_of_slots = D*H
+        self.number_of_classes = C
+
+        required_hours = np.asarray(timetable.inp.required_hours_per_professor_per_class)
+        max_hours = np.minimum(timetable.inp.max_hours_per_professor_per_class_per_day, required_hours)
+        self.required = required_hours.ravel().tolist()
+        self.day_limit = max_hours.ravel().tolist()
+
+        self.columns = timetable.K.ravel().tolist() # The column of every (i, d, h, c), -1 if there is none
+        self.pair_columns = [[] for _ in range(len(self.required))]
+        for j, p in enumerate(self.pair):
+            if self.usable[j]:
+                self.pair_columns[p].append(j)
+
+        # The lesson at every professor slot and class slot (-1 if free) and the hours of every pair and day
+        self.at_professor_slot = [-1]*(timetable.number_of_profs*D*H)
+        self.at_class_slot = [-1]*(D*H*C)
+        self.pair_count = [0]*len(self.required)
+        self.day_count = [0]*(timetable.number_of_profs*D*C)
+        self.taught = [False]*len(self.objective)
+        self.lessons = [] # The taught columns, with the position of every one in position
+        self.position = [-1]*len(self.objective)
+        self.value = 0.0
+        self.random = random.Random(seed)
+
+    def add(self, j):
+        self.at_professor_slot[self.professor_slot[j]] = j
+        self.at_class_slot[self.class_slot[j]] = j
+        self.pair_count[self.pair[j]] += 1
+        self.day_count[self.day[j]] += 1
+        self.taught[j] = True
+        self.position[j] = len(self.lessons)
+        self.lessons.append(j)
+        self.value += self.objective[j]
+
+    def remove(self, j):
+        self.at_professor_slot[self.professor_slot[j]] = -1
+        self.at_class_slot[self.class_slot[j]] = -1
+        self.pair_count[self.pair[j]] -= 1
+        self.day_count[self.day[j]] -= 1
+        self.taught[j] = False
+        last = self.lessons.pop()
+        if last != j:
+            self.lessons[self.position[j]] = last
+            self.position[last] = self.position[j]
+        self.position[j] = -1
+        self.value -= self.objective[j]
+
+    def can_add(self, j):
+        p = self.pair[j]
+        return (self.usable[j] and not self.taught[j] and self.at_professor_slot[self.professor_slot[j]] < 0
+                and self.at_class_slot[self.class_slot[j]] < 0 and self.pair_count[p] < self.required[p]
+                and self.day_count[self.day[j]] < self.day_limit[p])
+
+    def construct(self, start=()):
+        """Adds the lessons of start that fit, then the others greedily: the pairs with the least spare hours
+        first (they are the hardest to place), and the best lessons of every pair first"""
+        for j in start:
+            if self.can_add(j):
+                self.add(j)
+        spare = np.array([len(columns) - required for columns, required in zip(self.pair_columns, self.required)])
+        for j in np.lexsort((-np.array(self.objective), spare[self.pair])).tolist():
+            if self.can_add(j):
+                self.add(j)
+
+    # Every move returns the change of the objective and a function that makes it, or None if it is not possible
+
+    def insert_move(self):
+        """Teaches a lesson that is not taught, removing the lessons at its professor slot and class slot"""
+        k = self.random.randrange(len(self.objective))
+        if self.taught[k] or not self.usable[k]:
+            return None
+        blocking = {self.at_professor_slot[self.professor_slot[k]], self.at_class_slot[self.class_slot[k]]} - {-1}
+        p = self.pair[k]
+        if self.pair_count[p] - sum(self.pair[b] == p for b in blocking) >= self.required[p]:
+            return None
+        if self.day_count[self.day[k]] - sum(self.day[b] == self.day[k] for b in blocking) >= self.day_limit[p]:
+            return None
+
+        def apply():
+            for b in blocking:
+                self.remove(b)
+            self.add(k)
+        return self.objective[k] - sum(self.objective[b] for b in blocking), apply
+
+    def relocate_move(self):
+        """Moves a lesson to another hour of the same professor and class"""
+        j = self.lessons[self.random.randrange(len(self.lessons))]
+        columns = self.pair_columns[self.pair[j]]
+        k = columns[self.random.randrange(len(columns))]
+        if (self.taught[k] or self.at_professor_slot[self.professor_slot[k]] >= 0 or self.at_class_slot[self.class_slot[k]] >= 0
+                or (self.day[k] != self.day[j] and self.day_count[self.day[k]] >= self.day_limit[self.pair[k]])):
+            return None
+
+        def apply():
+            self.remove(j)
+            self.add(k)
+        return self.objective[k] - self.objective[j], apply
+
+    def swap_move(self):
+        """Exchanges the hours of two lessons of the same class with different professors"""
+        j = self.lessons[self.random.randrange(len(self.lessons))]
+        C = self.number_of_classes
+        c = self.class_slot[j] % C
+        other = self.at_class_slot[self.random.randrange(self.number_of_slots)*C + c]
+        if other < 0 or self.professor_slot[other]//self.number_of_slots == self.professor_slot[j]//self.number_of_slots:
+            return None
+        k = self.column(j, other)
+        l = self.column(other, j)
+        if k < 0 or l < 0 or self.at_professor_slot[self.professor_slot[k]] >= 0 or self.at_professor_slot[self.professor_slot[l]] >= 0:
+            return None
+        if self.day[k] != self.day[j] and (self.day_count[self.day[k]] >= self.day_limit[self.pair[k]]
+                                           or self.day_count[self.day[l]] >= self.day_limit[self.pair[l]]):
+            return None
+
+        def apply():
+            self.remove(j)
+            self.remove(other)
+            self.add(k)
+            self.add(l)
+        return self.objective[k] + self.objective[l] - self.objective[j] - self.objective[other], apply
+
+    def column(self, j, at):
+        """The usable column of the professor and class of lesson j at the slot of lesson at, -1 if there is none"""
+        i = self.professor_slot[j]//self.number_of_slots
+        slot = self.class_slot[at]//self.number_of_classes
+        k = self.columns[(i*self.number_of_slots + slot)*self.number_of_classes + self.class_slot[j] % self.number_of_classes]
+        return k if k >= 0 and self.usable[k] else -1
+
+    def anneal(self, time_limit=None, iterations=None, temperatures=(2.0, 0.01), callback=None, started=None):
+        """Simulated annealing from the current timetable, returns the best lessons found and their objective
+
+        The temperature goes down geometrically from temperatures[0] to temperatures[1] over the time limit
+        (or over the iterations). callback is called with the objective of every improved timetable,
+        if it returns True the search stops."""
+        started = time.perf_counter() if started is None else started
+        best, best_value = list(self.lessons), self.value
+        if len(self.objective) == 0: # Nothing can be taught
+            return best, best_value
+        moves = [self.insert_move, self.relocate_move, self.swap_move]
+        temperature = temperatures[0]
+        iteration = 0
+        while iterations is None or iteration < iterations:
+            if iteration % 256 == 0:
+                elapsed = time.perf_counter() - started
+                if time_limit is not None and elapsed >= time_limit:
+                    break
+                progress = iteration/iterations if iterations is not None else elapsed/time_limit
+                temperature = temperatures[0]*(temperatures[1]/temperatures[0])**min(progress, 1)
+            iteration += 1
+            if len(self.lessons) == 0:
+                move = self.insert_move()
+            else:
+                move = moves[self.random.randrange(3)]()
+            if move is None:
+                continue
+            delta, apply = move
+            if delta >= 0 or self.random.random() < math.exp(delta/temperature):
+                apply()
+                if self.value > best_value + 1e-9:
+                    best, best_value = list(self.lessons), self.value
+                    if callback is not None and callback(best_value):
+                        break
+        return best, best_value
+
+
+def solve(timetable, time_limit=0.5, iterations=None, seed=0, start=None, callback=None, temperatures=(2.0, 0.01)):
+    """Finds a timetable with the local search, sets it as the solution of timetable and returns a solvers.SolveResult
+
+    time_limit: seconds of search after the greedy timetable (None to only stop after iterations)
+    iterations: maximum number of moves tried, with a fixed seed the result is then the same on every run
+    start: assignments (i, d, h, c) to start from, e.g. from assignments(); those that do not fit are dropped
+    callback: called with the objective of every improved timetable, if it returns True the search stops
+    The status is "feasible", or "no solution" if a complete timetable was asked for and not found."""
+    started = time.perf_counter()
+    if time_limit is None and iterations is None:
+        raise ValueError("Give a time_limit or a number of iterations")
+    if timetable.backend is None: # Only the variables and the objective are needed, not the whole model
+        timetable.presolve()
+        timetable.create_timetable()
+        timetable.create_unavailable_hours_constraints() # In dense mode the unusable variables are only fixed to 0 here
+        timetable.set_objective()
+    if timetable.presolve_infeasible():
+        return timetable.result
+
+    with profiling.phase(timetable, "heuristic"):
+        search = LocalSearch(timetable, seed)
+        columns = [] if start is None else [timetable.column(key) for key in start]
+        search.construct([j for j in columns if j is not None])
+        best, objective = search.anneal(time_limit, iterations, temperatures, callback, started)
+
+    values = np.zeros(len(timetable.keys))
+    values[best] = 1
+    elapsed = time.perf_counter() - started
+    if timetable.complete and len(best) < np.sum(timetable.inp.required_hours_per_professor_per_class):
+        timetable.result = solvers.SolveResult("no solution", time=elapsed)
+        timetable.set_solution(None)
+    else:
+        timetable.result = solvers.SolveResult("feasible", objective, None, elapsed, values)
+        timetable.set_solution(timetable.keys[values > 0.5])
+    return timetable.result
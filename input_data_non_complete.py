@@ -1,6 +1,8 @@
+import os
+
 import numpy as np
 
-np.random.seed(0)
+np.random.seed(int(os.environ.get("TIMETABLE_SEED", 0))) # The seed can be changed to get other inputs, e.g. by batch.py
 
 number_of_classes = 3
 number_of_days = 5
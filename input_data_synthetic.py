@@ -0,0 +1,135 @@
+import types
+
+import numpy as np
+
+import timetable_input
+
+
+days_initials = ['M', 'T', 'W', 'Th', 'F', 'Sa', 'Su']
+
+
+def generate(number_of_professors, number_of_classes, number_of_days=5, number_of_hours=6, seed=0, limits_for_unavailability=(2, 10)):
+    """Creates a random input of any size, in the same way as input_data.py does
+
+    Returns a timetable_input.TimetableInput.
+    Unlike input_data.py, every class starts distributing its hours from a different professor,
+    so that with many classes the hours are spread over all the professors.
+    """
+    rng = np.random.RandomState(seed)
+
+    ## Create the required hours per class per proffessor
+    required_hours_per_professor_per_class = [[] for _ in range(number_of_professors)]
+    for class_id in range(number_of_classes):
+        hours_left_for_class = number_of_hours*number_of_days ## Number of hours left to distribute for each class
+        first = rng.randint(0, number_of_professors)
+        hours_for_class = [0 for _ in range(number_of_professors)]
+        for n in range(number_of_professors):
+            professor_id = (first + n) % number_of_professors
+            if hours_left_for_class == 0:
+                break
+            try:
+                prof_hours_for_class = rng.randint(1, min(5, hours_left_for_class))
+            except ValueError:
+                prof_hours_for_class = hours_left_for_class
+            hours_for_class[professor_id] = int(prof_hours_for_class)
+            hours_left_for_class -= prof_hours_for_class
+        for professor_id in range(number_of_professors):
+            required_hours_per_professor_per_class[professor_id].append(hours_for_class[professor_id])
+
+    ## Create the max hours per class per day for each professor
+    max_hours_per_professor_per_class_per_day = [[(hours if hours <= 2 else 2) for hours in professor_hours] for professor_hours in required_hours_per_professor_per_class]
+
+    ## Create the preferred and avoided days for each professor
+    preferred_days_per_professor = [[] for _ in range(number_of_professors)]
+    days_to_avoid_per_professor = [[] for _ in range(number_of_professors)]
+    for professor_id in range(number_of_professors):
+        preferred_days_per_professor[professor_id] = _pick_preferred(professor_id, number_of_days, rng)
+        days_to_avoid_per_professor[professor_id] = _pick_avoided(professor_id, number_of_days, preferred_days_per_professor[professor_id], rng)
+
+    ## Create the preferred and avoided hours for each professor
+    preferred_hours_per_professor = [[] for _ in range(number_of_professors)]
+    hours_to_avoid_per_professor = [[] for _ in range(number_of_professors)]
+    for professor_id in range(number_of_professors):
+        preferred_hours_per_professor[professor_id] = _pick_preferred(professor_id, number_of_hours, rng)
+        hours_to_avoid_per_professor[professor_id] = _pick_avoided(professor_id, number_of_hours, preferred_hours_per_professor[professor_id], rng)
+
+    ## Create the unavailable hours for each professor
+    unavailable_hours_per_professor = [[] for _ in range(number_of_professors)]
+    for professor_id in range(number_of_professors):
+        for _ in range(rng.randint(*limits_for_unavailability)): # Number of unavailable hours
+            day = rng.randint(0, number_of_days)
+            if day in preferred_days_per_professor[professor_id]: # Reducing the amount of unavailable hours on preferred days (not 0)
+                day = rng.randint(0, number_of_days)
+
+            hour = rng.randint(0, number_of_hours)
+            if hour in preferred_hours_per_professor[professor_id]: # Reducing the amount of unavailable hours on preferred hours (not 0)
+                hour = rng.randint(0, number_of_hours)
+            unavailable_hours_per_professor[professor_id].append((day, hour))
+
+    return timetable_input.from_module(types.SimpleNamespace(
+        number_of_classes=number_of_classes,
+        number_of_days=number_of_days,
+        number_of_hours=number_of_hours,
+        number_of_professors=number_of_professors,
+        limits_for_unavailability=list(limits_for_unavailability),
+        days_initials=[days_initials[d] if d < len(days_initials) else f"D{d}" for d in range(number_of_days)],
+        class_names=[chr(ord("A") + c) if c < 26 else f"C{c}" for c in range(number_of_classes)],
+        required_hours_per_professor_per_class=required_hours_per_professor_per_class,
+        max_hours_per_professor_per_class_per_day=max_hours_per_professor_per_class_per_day,
+        preferred_days_per_professor=preferred_days_per_professor,
+        days_to_avoid_per_professor=days_to_avoid_per_professor,
+        preferred_hours_per_professor=preferred_hours_per_professor,
+        hours_to_avoid_per_professor=hours_to_avoid_per_professor,
+        unavailable_hours_per_professor=unavailable_hours_per_professor,
+    ))
+
+
+def generate_schools(number_of_schools, number_of_professors, number_of_classes, seed=0, **options):
+    """Creates the input of several schools scheduled together, each one made by generate() with its own seed
+
+    The professors and classes of the schools are numbered one school after the other,
+    and no professor teaches in two schools."""
+    schools = [generate(number_of_professors, number_of_classes, seed=seed + n, **options) for n in range(number_of_schools)]
+    required_hours = np.zeros((number_of_professors*number_of_schools, number_of_classes*number_of_schools), dtype=np.int64)
+    max_hours_per_day = np.zeros_like(required_hours)
+    for n, school in enumerate(schools): # One block per school
+        block = np.s_[n*number_of_professors:(n + 1)*number_of_professors, n*number_of_classes:(n + 1)*number_of_classes]
+        required_hours[block] = school.required_hours_per_professor_per_class
+        max_hours_per_day[block] = school.max_hours_per_professor_per_class_per_day
+    class_names = [f"{name}{n}" for n in range(number_of_schools) for name in schools[n].class_names]
+    return timetable_input.TimetableInput(
+        class_names, schools[0].days_initials, schools[0].number_of_hours, required_hours, max_hours_per_day,
+        np.concatenate([school.available for school in schools]),
+        *[[values for school in schools for values in getattr(school, name)] for name in timetable_input.preference_fields])
+
+
+def _pick_preferred(professor_id, n, rng):
+    """Two preferred days (or hours) out of n, like in input_data.py"""
+    ind1 = professor_id % n
+    ind2 = rng.randint(0, n)
+    while ind2 == ind1 or ind2 == (professor_id+1) % n:
+        ind2 = rng.randint(0, n)
+    return [ind1, ind2]
+
+
+def _pick_avoided(professor_id, n, preferred, rng):
+    """Two days (or hours) to avoid out of n that are not preferred, like in input_data.py"""
+    ind1 = (professor_id+1) % n
+    ind2 = rng.randint(0, n)
+    while ind2 in preferred + [ind1]:
+        ind2 = rng.randint(0, n)
+    return [ind1, ind2]
+
+
+def generate_sections(number_of_professors, number_of_grades, sections, seed=0, **options):
+    """Creates the input of a school where every grade has several sections with the same curriculum
+
+    The grades are made by generate(), then every grade becomes sections classes with the same professors and hours.
+    The sections of a grade are identical classes (see symmetry.py)."""
+    grades = generate(number_of_professors, number_of_grades, seed=seed, **options)
+    columns = np.repeat(np.arange(number_of_grades), sections)
+    class_names = [f"{name}{n + 1}" for name in grades.class_names for n in range(sections)]
+    return timetable_input.TimetableInput(
+        class_names, grades.days_initials, grades.number_of_hours, grades.required_hours_per_professor_per_class[:, columns],
+        grades.max_hours_per_professor_per_class_per_day[:, columns], grades.available,
+        *[getattr(grades, name) for name in timetable_input.preference_fields])
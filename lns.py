@@ -0,0 +1,241 @@
+"""Improves a timetable with large neighborhood search (fix and optimize), using the MIP on small parts of it
+
+For big schools the whole model is too slow to solve, but a small part of it is solved in seconds. Starting from
+a feasible timetable (e.g. from heuristic.py), the lessons of a neighborhood are freed, every other lesson is kept
+as it is, and the neighborhood is solved as its own Timetable with a short time limit:
+    - "day": every lesson of one day
+    - "class": every lesson of one class
+    - "professors": every lesson of a few professors
+The kept lessons are taken out of the input of the neighborhood: the hours at which its professors teach
+other lessons become unavailable, the hours its classes are taught by other professors are blocked and the
+required hours are lowered by the hours taught outside of it. So the model of a neighborhood is small and the
+main process never builds the whole model.
+
+Neighborhoods that have no lesson in common are solved in parallel processes, all from the same timetable.
+Their timetables are then merged one at a time, each one only if the merged timetable is still feasible
+(see verify.py) and better.
+
+    result = lns.solve(timetable, time_limit=300, neighborhood_time=10)
+"""
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import heuristic
+import presolve
+import solvers
+import timetable_input
+import verify
+
+
+kinds = ["day", "class", "professors"]
+
+
+def neighborhoods(inp, kind, rng, group_size=3):
+    """Returns the neighborhoods of a kind as (professors, days, classes) sorted lists, the lessons that are freed
+    are those of one of the professors, on one of the days, of one of the classes"""
+    required_hours = np.asarray(inp.required_hours_per_professor_per_class) > 0
+    professors = list(range(inp.number_of_professors))
+    days = list(range(inp.number_of_days))
+    classes = list(range(inp.number_of_classes))
+    if kind == "day":
+        return [(professors, [d], classes) for d in days]
+    if kind == "class":
+        return [(np.flatnonzero(required_hours[:, c]).tolist(), days, [c]) for c in classes if required_hours[:, c].any()]
+    if kind == "professors": # Random groups that cover every professor once
+        order = [i for i in professors if required_hours[i].any()]
+        rng.shuffle(order)
+        groups = [sorted(order[n:n + group_size]) for n in range(0, len(order), group_size)]
+        return [(group, days, np.flatnonzero(required_hours[group].any(axis=0)).tolist()) for group in groups]
+    raise ValueError(f"Unknown neighborhood {kind!r}, choose one of: {', '.join(kinds)}")
+
+
+def overlap(first, second):
+    """True if two neighborhoods free some lesson in common"""
+    return all(set(a) & set(b) for a, b in zip(first, second))
+
+
+def inside(assignments, neighborhood):
+    """Bool array, True for the assignments freed by the neighborhood"""
+    professors, days, classes = neighborhood
+    return np.isin(assignments[:, 0], professors) & np.isin(assignments[:, 1], days) & np.isin(assignments[:, 3], classes)
+
+
+def neighborhood_input(inp, assignments, neighborhood):
+    """Returns (input, blocked, start): the input of the neighborhood with the kept lessons taken out, a (days x hours
+    x classes) bool array of the hours its classes are taught by other professors and the freed lessons, renumbered"""
+    professors, days, classes = neighborhood
+    freed = inside(assignments, neighborhood)
+    kept = assignments[~freed]
+
+    busy = np.zeros(inp.available.shape, dtype=bool) # The professors teach a kept lesson
+    busy[kept[:, 0], kept[:, 1], kept[:, 2]] = True
+    taken = np.zeros((inp.number_of_days, inp.number_of_hours, inp.number_of_classes), dtype=bool) # The classes have a kept lesson
+    taken[kept[:, 1], kept[:, 2], kept[:, 3]] = True
+    taught = np.zeros(inp.required_hours_per_professor_per_class.shape, dtype=np.int64) # Hours of every pair in kept lessons
+    np.add.at(taught, (kept[:, 0], kept[:, 3]), 1)
+
+    def per_professor(values):
+        return [values[i] for i in professors]
+
+    def day_numbers(values): # The preferred (or avoided) days, numbered as in the neighborhood
+        return [[n for n, d in enumerate(days) if d in v] for v in values]
+
+    available = np.asarray(inp.available, dtype=bool) & ~busy
+    sub_input = timetable_input.TimetableInput(
+        [inp.class_names[c] for c in classes], [inp.days_initials[d] for d in days], inp.number_of_hours,
+        (inp.required_hours_per_professor_per_class - taught)[np.ix_(professors, classes)],
+        inp.max_hours_per_professor_per_class_per_day[np.ix_(professors, classes)],
+        available[np.ix_(professors, days)],
+        day_numbers(per_professor(inp.preferred_days_per_professor)), day_numbers(per_professor(inp.days_to_avoid_per_professor)),
+        per_professor(inp.preferred_hours_per_professor), per_professor(inp.hours_to_avoid_per_professor),
+        per_professor(inp.professor_names))
+
+    start = assignments[freed]
+    start = np.stack([np.searchsorted(professors, start[:, 0]), np.searchsorted(days, start[:, 1]), start[:, 2],
+                      np.searchsorted(classes, start[:, 3])], axis=1)
+    return sub_input, taken[np.ix_(days, range(inp.number_of_hours), classes)], start
+
+
+def solve_neighborhood(inp, options, params, extra_priority, blocked, start, time_limit):
+    """Builds and solves the Timetable of one neighborhood (runs in a worker process)
+
+    Returns the SolveResult, without the values, and the assignments (i, d, h, c) with the numbering of the neighborhood."""
+    import main
+
+    timetable = main.Timetable(inp, params=params, extra_priority=extra_priority, **options)
+    i, d, h, c = timetable.keys.T
+    columns = np.flatnonzero(blocked[d, h, c])
+    if len(columns) > 0:
+        timetable.upper[columns] = 0
+        timetable.backend.set_col_upper(columns, timetable.upper[columns])
+    result = timetable.solve(time_limit=time_limit, start=[tuple(key) for key in start.tolist()])
+    assignments = timetable.assignments() if timetable.solved else []
+    result.values = None
+    return result, assignments
+
+
+def describe(inp, kind, professors, days, classes):
+    """The day, the class or the professors of a neighborhood, for the messages"""
+    if kind == "day":
+        return inp.days_initials[days[0]]
+    if kind == "class":
+        return inp.class_names[classes[0]]
+    return ", ".join(inp.professor_names[i] for i in professors)
+
+
+def solve(timetable, time_limit=60, neighborhood_time=5, iterations=None, workers=None, start=None, kinds=kinds,
+          group_size=3, seed=0, callback=None):
+    """Improves a feasible timetable with the neighborhoods of kinds, in up to workers processes, and sets the best
+    timetable found as the solution of timetable. Returns a solvers.SolveResult with the status "feasible".
+
+    time_limit: seconds of search, every neighborhood gets at most neighborhood_time seconds
+    iterations: maximum number of neighborhoods solved (None to only stop at the time limit)
+    start: the assignments (i, d, h, c) to start from, by default the solution of timetable or else a timetable of
+    the heuristic (which needs to be complete for Timetable(complete=True))
+    group_size: number of professors of the "professors" neighborhoods
+    callback: called with the objective of every improved timetable, if it returns True the search stops
+    The search also stops when no neighborhood improved the timetable for as many neighborhoods as there are of
+    all kinds together. Every improvement is printed with the neighborhood it came from."""
+    started = time.perf_counter()
+    if time_limit is None and iterations is None:
+        raise ValueError("Give a time_limit or a number of iterations")
+    if timetable.backend is None: # Only the variables and the objective are needed, not the whole model
+        timetable.presolve()
+        timetable.create_timetable()
+        timetable.create_unavailable_hours_constraints() # In dense mode the unusable variables are only fixed to 0 here
+        timetable.set_objective()
+    if timetable.presolve_infeasible():
+        return timetable.result
+
+    inp = timetable.inp
+    if start is None and timetable.solution is not None:
+        start = timetable.solution
+    if start is None:
+        result = heuristic.solve(timetable, time_limit=min(1.0, time_limit or 1.0))
+        if result.status != "feasible":
+            return result
+        start = timetable.solution
+    current = np.array(start, dtype=np.int64).reshape(-1, 4)
+    report = verify.check(inp, current, timetable.params, timetable.extra_priority, timetable.complete, details=False)
+    if not report["feasible"]:
+        raise ValueError(f"The start timetable breaks constraints of the model: {report['violations']}")
+    objective = report["objective"]
+    print(f"LNS start: objective {objective}")
+
+    options = {"sparse": True, "backend": timetable.backend_name, "complete": timetable.complete}
+    rng = random.Random(seed)
+    workers = os.cpu_count() if workers is None else workers
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    candidates = []
+    solved = rounds = 0
+    # A round solves every neighborhood of every kind once, after a round without improvement the search stops
+    round_size = sum(len(neighborhoods(inp, kind, random.Random(seed), group_size)) for kind in kinds)
+    unimproved = 0
+    try:
+        while iterations is None or solved < iterations:
+            remaining = None if time_limit is None else time_limit - (time.perf_counter() - started)
+            if remaining is not None and remaining <= 0:
+                break
+            # The neighborhoods of the next kind, in a random order, then as many as there are workers that do not overlap
+            if len(candidates) == 0:
+                kind = kinds[rounds % len(kinds)]
+                rounds += 1
+                candidates = neighborhoods(inp, kind, rng, group_size)
+                rng.shuffle(candidates)
+            batch = []
+            for neighborhood in list(candidates):
+                if len(batch) == workers or (iterations is not None and solved + len(batch) == iterations):
+                    break
+                if not any(overlap(neighborhood, other) for other in batch):
+                    batch.append(neighborhood)
+                    candidates.remove(neighborhood)
+
+            tasks, solvable = [], []
+            for neighborhood in batch:
+                sub_input, blocked, sub_start = neighborhood_input(inp, current, neighborhood)
+                # A neighborhood with no lesson that can be taught has nothing to improve (and its model no columns)
+                if not (presolve.usable(sub_input) & ~blocked[np.newaxis]).any():
+                    continue
+                solvable.append(neighborhood)
+                tasks.append((sub_input, options, timetable.params, [timetable.extra_priority[i] for i in neighborhood[0]],
+                              blocked, sub_start, neighborhood_time if remaining is None else max(1, min(neighborhood_time, remaining))))
+            if executor is None or len(tasks) == 0:
+                outputs = [solve_neighborhood(*task) for task in tasks]
+            else:
+                outputs = list(executor.map(solve_neighborhood, *zip(*tasks)))
+            solved += len(batch)
+            unimproved += len(batch)
+
+            # The timetables of the batch were found from the same timetable, so every one is checked again once merged
+            stop = False
+            for (professors, days, classes), (result, assignments) in zip(solvable, outputs):
+                if result.status not in ("optimal", "feasible"):
+                    continue
+                lessons = np.array(assignments, dtype=np.int64).reshape(-1, 4)
+                lessons = np.stack([np.asarray(professors)[lessons[:, 0]], np.asarray(days)[lessons[:, 1]], lessons[:, 2],
+                                    np.asarray(classes)[lessons[:, 3]]], axis=1)
+                candidate = np.concatenate([current[~inside(current, (professors, days, classes))], lessons])
+                report = verify.check(inp, candidate, timetable.params, timetable.extra_priority, timetable.complete, details=False)
+                if report["feasible"] and report["objective"] > objective + 1e-9:
+                    print(f"LNS {time.perf_counter() - started:.1f}s: objective {report['objective']} "
+                          f"(+{report['objective'] - objective:g}) from the {kind} neighborhood {describe(inp, kind, professors, days, classes)}")
+                    current, objective = candidate, report["objective"]
+                    unimproved = 0
+                    if callback is not None and callback(objective):
+                        stop = True
+            if stop or unimproved >= round_size:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    values = np.zeros(len(timetable.keys))
+    values[[timetable.column(key) for key in current.tolist()]] = 1
+    timetable.result = solvers.SolveResult("feasible", objective, None, time.perf_counter() - started, values)
+    timetable.set_solution(timetable.keys[values > 0.5])
+    return timetable.result
+
@@ -1,46 +1,620 @@
+import json
+import os
+import sys
+
 import numpy as np 
-import pymprog
 
-import input_data as inp
-# import input_data_non_complete as inp
-import input_data_real as inp
+import presolve
+import profiling
+import solvers
+import symmetry
+import timetable_input
+import verify
+from solution_cache import SolutionCache, input_key
+
+
+def load_timetable(path):
+    """Reads the assignments (professor, day, hour, class) of a timetable saved with Timetable.save_timetable"""
+    with open(path) as f:
+        return [tuple(key) for key in json.load(f)["assignments"]]
+
+
+def integer_scale(coefficients, max_scale=1000):
+    """Returns the smallest integer (up to max_scale) that makes every coefficient an integer, 1 if there is none"""
+    for scale in range(1, max_scale + 1):
+        scaled = scale*np.asarray(coefficients, dtype=float)
+        if np.allclose(scaled, np.round(scaled), rtol=0, atol=1e-9):
+            return scale
+    return 1
 
 
 class Timetable:
 
-    def __init__(self, profs_n, days_n, hours_n, classes_n):
-        self.number_of_classes = classes_n
-        self.number_of_profs = profs_n
-        self.number_of_days = days_n
-        self.number_of_hours = hours_n
+    def __init__(self, inp, sparse=True, backend="glpk", complete=False, build=True, profiler=None, symmetry=False, params=None, strong=False,
+                 extra_priority=None):
+        """inp is the input of the timetable: a timetable_input.TimetableInput, or an input module like input_data_real
+
+        profiler: a profiling.Profiler that records the time and memory of every phase (profiling.default_profiler by default)
+        symmetry: adds constraints that keep only one of the timetables that differ by exchanging identical classes or professors
+        params: weights of the objective that differ from the defaults below, e.g. {"coverage": 50}
+        strong: adds the hours per day of every proffessor and class as rows and tightens the bounds of the rows
+        to the hours that can really be taught, which makes the LP relaxation tighter (see create_strengthening_constraints)
+        extra_priority: the weight of the preferences of every proffessor, a list with one number per proffessor
+        (by default 1 for everyone and 2 for proffessor 0)"""
+        self.inp = timetable_input.from_module(inp)
+        self.number_of_classes = self.inp.number_of_classes
+        self.number_of_profs = self.inp.number_of_professors
+        self.number_of_days = self.inp.number_of_days
+        self.number_of_hours = self.inp.number_of_hours
+        self.sparse = sparse
+        self.complete = complete # If True every professor has to teach all the required hours (== instead of <=)
+        self.symmetry = symmetry
+        self.symmetry_groups = ([], []) # The identical (classes, professors) with their pivots, see symmetry.py
+        self.symmetry_rows = [] # The rows added by create_symmetry_breaking_constraints that are still used
+        self.strong = strong
         self.solved = False
-
-        self.K = np.ndarray(shape=(self.number_of_profs, self.number_of_days, self.number_of_hours, self.number_of_classes), dtype=pymprog._var)
-        self.model = pymprog.model('Timetable')
-        
+        self.profiler = profiler if profiler is not None else profiling.default_profiler # Can be changed at any time
+
+        self.available = self.inp.available # False where the professor is unavailable
+
+        self.problems = None # The problems of the input found by presolve (see presolve.py)
+        self.presolve_fixed = [] # The keys (i, d, h, c) of the variables fixed to 0 by presolve for a complete timetable
+        self.K = None # (professors x days x hours x classes) int32 array with the column of every variable, -1 if it has none
+
+        # The constraint matrix in coordinate format, filled by the create_*_constraints methods
+        self.matrix_rows = []
+        self.matrix_cols = []
+        self.matrix_vals = []
+        self.row_lower = []
+        self.row_upper = []
+        self.number_of_rows = 0
+        self.families = {} # The rows added by add_rows, by name, so that they can be extended and changed later
+        self.backend_name = backend
+        self.backend = None # The rows and columns are only given to the backend once the model is built
+        self.result = None # The solvers.SolveResult of the last solve
+        self.solution = None # The assignments (i, d, h, c) of the last solve, as an array with one row per assignment
+        self.grid = None # The same solution as a (professors x days x hours x classes) uint8 array, 1 where taught
+
+        # Weights of the objective, they can be changed later with set_weight and set_priority
+        self.params = {
+            "coverage": 100,
+            "preferred_days": 2,
+            "avoidance_days": 2,
+            "preferred_hours": 0.5,
+            "avoidance_hours": 0.5,
+            
+        }
+        for name, weight in (params or {}).items():
+            self.set_weight(name, weight)
+        # If we want to give a higher priority to certain professors we can add a weight to the choices of those proffessors:
+        self.extra_priority =[1 for _ in range(self.number_of_profs)]
+        # self.extra_priority[0] = 0
+        # self.extra_priority[0] = 1
+        self.extra_priority[0] = 2
+        if extra_priority is not None:
+            if len(extra_priority) != self.number_of_profs:
+                raise ValueError(f"extra_priority needs one value per proffessor ({self.number_of_profs}), got {len(extra_priority)}")
+            self.extra_priority = list(extra_priority)
+
+        # With build=False the model is only built when solve() needs it (not if the solution is in the cache)
+        if build:
+            self.build()
+
+    @profiling.profiled
+    def build(self):
+        """Creates the variables, the constraints and the objective and loads them to the solver backend"""
+        self.presolve()
         self.create_timetable()
 
         self.create_physical_constraints()
         self.create_material_coverage__constraints()
         self.create_max_hours_per_day_constraints()
         self.create_unavailable_hours_constraints()
+        if self.symmetry:
+            self.create_symmetry_breaking_constraints()
+        if self.strong:
+            self.create_strengthening_constraints()
         
         self.set_objective()
 
+        with profiling.phase(self, "load_backend"):
+            self.backend = solvers.get_backend(self.backend_name)
+            self.backend.load(self)
+        self.change_limit_row = None # Row used by solve(max_changes=...)
         
     
+    @profiling.profiled
+    def presolve(self):
+        """Checks the input and finds the variables that are 0 in every timetable (see presolve.py)"""
+        self.usable, self.problems = presolve.run(self.inp, self.complete)
+        self.presolve_fixed = [tuple(key) for key in np.argwhere(presolve.usable(self.inp) & ~self.usable).tolist()]
+
+    @profiling.profiled
     def create_timetable(self):
+        """Creates the variables K_i_j_k_l (proffessor i teaches class l at day j and hour k)
+
+        In sparse mode a variable is only created if presolve did not fix it to 0, e.g. because the proffessor
+        has no required hours for the class or is not available at that time.
+        """
+        if self.sparse:
+            mask = self.usable
+        else:
+            mask = np.ones((self.number_of_profs, self.number_of_days, self.number_of_hours, self.number_of_classes), dtype=bool)
         
-        for i in range(self.number_of_profs):
-            for j in range(self.number_of_days):
-                for k in range(self.number_of_hours):
-                    for l in range(self.number_of_classes):
-                        self.K[i][j][k][l] = self.model.var(f"K_{i}_{j}_{k}_{l}", kind=int, bounds=(0, 1))
+        # Row j of self.keys is the (i, j, k, l) of the variable in column j of the model
+        self.keys = np.argwhere(mask)
+        self.K = np.full(mask.shape, -1, dtype=np.int32)
+        self.K[tuple(self.keys.T)] = np.arange(len(self.keys))
+        self.upper = np.ones(len(self.keys), dtype=np.int64) # Upper bound of every variable (they are all binary)
+
+    def column(self, key):
+        """Returns the column of the variable key (i, d, h, c), None if it has none"""
+        if len(key) != 4 or not all(0 <= k < n for k, n in zip(key, self.K.shape)):
+            return None
+        j = int(self.K[tuple(key)])
+        return None if j < 0 else j
+
+    def variable_name(self, j):
+        """The name K_i_j_k_l of the variable in column j, only made when it is needed (e.g. to write the model)"""
+        return "K_" + "_".join(map(str, self.keys[j].tolist()))
+
+    def write_model(self, path):
+        """Writes the model to a file with the named variables, to read it or give it to another solver"""
+        if self.backend is None:
+            self.build()
+        self.backend.write_model(path)
+
+    def add_rows(self, name, group, upper, lower=None, single=True):
+        """Adds a row sum(K[j] for every variable j in group g) <= upper[g] for every group g that has variables
+
+        group is a function that maps the i, d, h, c arrays of the variables to their group ids,
+        upper/lower are indexed by group id. If lower is not given the rows have no lower bound.
+        If single is False, groups with a single variable get no row.
+        The rows are kept as the family name, so that new variables are added to them by add_variables."""
+        self.families[name] = {
+            "group": group,
+            "upper": np.asarray(upper, dtype=float),
+            "lower": None if lower is None else np.asarray(lower, dtype=float),
+            "single": single,
+            "rows": {}, # group id -> row
+        }
+        self.extend_family(name, np.arange(len(self.keys)))
+
+    def extend_family(self, name, columns):
+        """Adds the variables in columns to the rows of the family name, creating the rows of the groups that had none
+
+        Returns the (rows, cols) of the coefficients that were added to rows that already existed."""
+        family = self.families[name]
+        group = family["group"](*self.keys.T)
+        existing = np.array([g in family["rows"] for g in group[columns].tolist()], dtype=bool)
+        old_rows = np.array([family["rows"][g] for g in group[columns][existing].tolist()], dtype=np.int64)
+        old_cols = columns[existing]
+
+        # A new row gets every variable of its group, also the ones that were there before
+        members = np.flatnonzero(np.isin(group, group[columns][~existing]))
+        if not family["single"]:
+            size = np.bincount(group[members])
+            members = members[size[group[members]] > 1]
+        groups, rows = np.unique(group[members], return_inverse=True)
+
+        lower = np.full(len(groups), -np.inf) if family["lower"] is None else family["lower"][groups]
+        self.append_matrix(self.number_of_rows + rows, members, np.ones(len(members)), lower, family["upper"][groups])
+        family["rows"].update(zip(groups.tolist(), range(self.number_of_rows - len(groups), self.number_of_rows)))
+        return old_rows, old_cols
+
+    def append_matrix(self, rows, cols, vals, lower, upper):
+        """Appends coefficients and len(lower) new rows to the constraint matrix"""
+        self.matrix_rows.append(rows)
+        self.matrix_cols.append(cols)
+        self.matrix_vals.append(vals)
+        self.row_lower.append(lower)
+        self.row_upper.append(upper)
+        self.number_of_rows += len(lower)
+
+    def constraint_matrix(self):
+        """Returns all the rows of the model as (rows, cols, vals, row_lower, row_upper) arrays
+
+        The blocks added so far are joined into one, so changes to the returned arrays are kept."""
+        if len(self.matrix_rows) != 1:
+            for blocks, dtype in [(self.matrix_rows, np.int64), (self.matrix_cols, np.int64), (self.matrix_vals, float),
+                                  (self.row_lower, float), (self.row_upper, float)]:
+                blocks[:] = [np.concatenate(blocks).astype(dtype) if blocks else np.zeros(0, dtype=dtype)]
+        return self.matrix_rows[0], self.matrix_cols[0], self.matrix_vals[0], self.row_lower[0], self.row_upper[0]
+
+    def add_row(self, cols, vals, lower, upper):
+        """Adds the row lower <= sum(vals*K[cols]) <= upper to the model and returns its index"""
+        row = self.number_of_rows
+        self.append_matrix(np.full(len(cols), row), np.asarray(cols), np.asarray(vals, dtype=float), np.array([lower], dtype=float), np.array([upper], dtype=float))
+        if self.backend is not None:
+            self.backend.add_row(row, cols, vals, lower, upper)
+        return row
+
+    def change_row(self, row, cols, vals, lower, upper):
+        """Replaces the coefficients and the bounds of a row"""
+        rows, old_cols, old_vals, row_lower, row_upper = self.constraint_matrix()
+        kept = rows != row
+        self.matrix_rows[0] = np.concatenate([rows[kept], np.full(len(cols), row)])
+        self.matrix_cols[0] = np.concatenate([old_cols[kept], cols])
+        self.matrix_vals[0] = np.concatenate([old_vals[kept], np.asarray(vals, dtype=float)])
+        row_lower[row], row_upper[row] = lower, upper
+        self.backend.change_row(row, cols, vals, lower, upper)
+
+    def set_row_bounds(self, rows, lower, upper):
+        """Changes the bounds of rows, without touching their coefficients"""
+        rows = np.asarray(rows, dtype=np.int64)
+        _, _, _, row_lower, row_upper = self.constraint_matrix()
+        row_lower[rows], row_upper[rows] = lower, upper
+        self.backend.set_row_bounds(rows, row_lower[rows], row_upper[rows])
+
+    def assignments(self, values=None):
+        """Returns the keys (i, d, h, c) of the variables that are 1 in the solution
+
+        values can be given to use the values of another timetable, e.g. one given to the callback of solve()"""
+        if values is not None:
+            return [tuple(key) for key in self.keys[values > 0.5].tolist()]
+        return [] if self.solution is None else [tuple(key) for key in self.solution.tolist()]
+
+    def objective_value(self):
+        """Returns the value of the objective in the solution"""
+        return None if self.result is None else self.result.objective
     
-    def solve(self):
-        self.model.solve()
-        self.solved = True
+    def verify(self, assignments=None, details=True):
+        """Checks the solution (or other assignments (i, d, h, c)) against the rules of the model without the solver
+        and returns the report of verify.check, with the violations of every constraint and the objective"""
+        return verify.check_timetable(self, assignments, details)
+
+    def save_timetable(self, path):
+        """Saves the assignments of the solution to a json file, that can be given as start to solve()"""
+        with open(path, "w") as f:
+            json.dump({"assignments": self.assignments()}, f)
+
+    def start_values(self, assignments):
+        """Turns the assignments (i, d, h, c) of a previous timetable into values for the variables of this model
+
+        Assignments that are not possible anymore (e.g. the professor became unavailable or a limit was lowered)
+        are dropped, so that the values are a feasible timetable for the <= constraints of this model."""
+        rows, cols, vals, lower, upper = self.constraint_matrix()
+        order = np.argsort(cols, kind="stable")
+        starts = np.searchsorted(cols[order], np.arange(len(self.keys) + 1))
+        activity = np.zeros(len(upper))
+
+        values = np.zeros(len(self.keys))
+        for key in assignments:
+            j = self.column(key)
+            if j is None or self.upper[j] == 0 or values[j] == 1:
+                continue
+            col_rows, col_vals = rows[order[starts[j]:starts[j+1]]], vals[order[starts[j]:starts[j+1]]]
+            if np.all(activity[col_rows] + col_vals <= upper[col_rows]):
+                activity[col_rows] += col_vals
+                values[j] = 1
+        return values
+
+    def limit_changes(self, start, max_changes):
+        """Allows at most max_changes assignments to be added or removed compared to the assignments start
+        (None removes the limit)
+
+        Uses a single row: sum(K[j] for j not in start) + sum(1 - K[j] for j in start) <= max_changes - missing,
+        where missing is the number of assignments of start that have no variable in this model, they are always removed.
+        Every assignment of start counts, also those that start_values drops because they do not fit together."""
+        columns = np.arange(len(self.keys))
+        if max_changes is None:
+            if self.change_limit_row is not None: # The row is kept, without bounds
+                self.change_row(self.change_limit_row, columns, self.change_limit_coefficients, -np.inf, np.inf)
+            return
+        in_start = np.zeros(len(self.keys), dtype=bool)
+        missing = 0
+        for key in set(tuple(key) for key in start):
+            j = self.column(key)
+            if j is None:
+                missing += 1
+            else:
+                in_start[j] = True
+        if missing > 0:
+            print(f"{missing} assignments of start have no variable in the model, they count as changes")
+        self.change_limit_coefficients = np.where(in_start, -1.0, 1.0)
+        upper = max_changes - np.count_nonzero(in_start) - missing
+        if self.change_limit_row is None:
+            self.change_limit_row = self.add_row(columns, self.change_limit_coefficients, -np.inf, upper)
+        else:
+            self.change_row(self.change_limit_row, columns, self.change_limit_coefficients, -np.inf, upper)
+
+    def set_solution(self, solution):
+        """Keeps the assignments (i, d, h, c) of a solution (an array with one row per assignment, None if there is none)
+
+        They are extracted once per solve, the print and stats methods only use self.solution and self.grid."""
+        self.solved = solution is not None
+        self.solution = solution
+        self.grid = None
+        if solution is not None:
+            self.grid = np.zeros((self.number_of_profs, self.number_of_days, self.number_of_hours, self.number_of_classes), dtype=np.uint8)
+            self.grid[tuple(solution.T)] = 1
+
+    def cache_key(self, **options):
+        """Returns the key of the solution of this timetable in a SolutionCache, options are the solver options"""
+        options = dict(options, sparse=self.sparse, complete=self.complete, backend=self.backend_name, symmetry=self.symmetry,
+                       strong=self.strong)
+        return input_key(self.inp, self.params, self.extra_priority, options)
+
+    @profiling.profiled
+    def solve(self, time_limit=None, mip_gap=None, node_limit=None, callback=None, start=None, max_changes=None, cache=None):
+        """Solves the model and returns a solvers.SolveResult
+
+        time_limit: wall-clock limit of the solve in seconds
+        mip_gap: relative gap between the objective and the best bound at which the solver stops
+        node_limit: maximum number of branch-and-bound nodes (not supported by GLPK)
+        callback: called with a SolveResult (with the values of the variables) for every improved timetable found.
+        If it returns True the solver stops, keeping the best timetable found so far.
+        start: a previous timetable to start from, as a list of assignments (i, d, h, c), e.g. from assignments(),
+        or the path of a file written by save_timetable. It is given to the solver as the initial incumbent.
+        max_changes: with start, the maximum number of assignments that may be added or removed compared to start
+        (the assignments of start that have no variable in this model are always removed, so they count too)
+        cache: a SolutionCache. If the same input was solved before with the same options, the stored timetable is used
+        without building the model. Not used with start or callback.
+        """
+        use_cache = cache is not None and start is None and callback is None
+        if use_cache:
+            key = self.cache_key(time_limit=time_limit, mip_gap=mip_gap, node_limit=node_limit)
+            cached = cache.get(key)
+            if cached is not None:
+                self.result = cached[0]
+                self.set_solution(cached[1])
+                return self.result
+        if self.backend is None:
+            self.build()
+        if self.presolve_infeasible():
+            return self.result
+
+        if isinstance(start, str):
+            start = load_timetable(start)
+        if start is not None and len(self.symmetry_rows) > 0:
+            if max_changes is None: # The same timetable, with the identical classes and professors in the order of the constraints
+                start = symmetry.canonical(start, self.number_of_hours, *self.symmetry_groups)
+            else: # Exchanging classes would count as many changes, so the timetables close to start have to stay allowed
+                self.release_symmetry()
+        values = None if start is None else self.start_values(start)
+        self.limit_changes(start, max_changes if start is not None else None)
+
+        with profiling.phase(self, "solver"):
+            self.result = self.backend.solve(time_limit=time_limit, mip_gap=mip_gap, node_limit=node_limit, callback=callback, start=values)
+        self.set_solution(self.keys[self.result.values > 0.5] if self.result.status in ("optimal", "feasible") else None)
+        if use_cache and self.solved:
+            cache.put(key, self.result, self.solution)
+        return self.result
+
+    def presolve_infeasible(self):
+        """Returns True (with an infeasible self.result) if presolve found that there is no complete timetable
+
+        Then there is no need to ask the solver."""
+        if self.problems is None: # The input was changed after presolve
+            self.problems = presolve.run(self.inp, self.complete)[1]
+        if not self.complete or len(self.problems) == 0:
+            return False
+        presolve.print_problems(self.problems)
+        self.result = solvers.SolveResult("infeasible", time=0.0)
+        self.set_solution(None)
+        return True
+
+    def default_tiers(self):
+        """The tiers of solve_lexicographic: first the coverage, then all the preferences with their weights"""
+        return [{"coverage": 1}, {name: weight for name, weight in self.params.items() if name != "coverage"}]
+
+    def solve_lexicographic(self, tiers=None, time_limits=None, mip_gap=None, tolerance=1e-6):
+        """Optimizes the terms of the objective one tier after the other instead of as one weighted sum
+
+        Every tier is a dict {term name: weight} (the names of self.params), by default first the coverage and
+        then the preferences (see default_tiers). After a tier is solved its value is kept as a constraint
+        (at most tolerance worse, relative to the value) and the timetable found is the start of the next tier.
+        time_limits: the time limit of every tier in seconds (a list, or one number for all of them)
+        The objective of every tier is given to the solver scaled to integer coefficients (see integer_scale).
+        Prints and keeps in self.stages the result of every tier, and returns the SolveResult of the last one,
+        with the objective of the weighted sum (self.params) and the total time.
+        """
+        tiers = self.default_tiers() if tiers is None else tiers
+        if time_limits is None or isinstance(time_limits, (int, float)):
+            time_limits = [time_limits]*len(tiers)
+        if self.backend is None:
+            self.build()
+        self.stages = []
+        if self.presolve_infeasible():
+            return self.result
+        if not hasattr(self, "level_rows"):
+            self.level_rows = [] # One row per tier, keeping the value of the tier once it is solved
+
+        columns = np.arange(len(self.keys))
+        terms = self.objective_terms()
+        values = None
+        try:
+            for n, (tier, time_limit) in enumerate(zip(tiers, time_limits)):
+                coefficients = self.weighted_objective(tier, terms)
+                # With integer coefficients the solvers round the bound of the tier, so they can prove it optimal as
+                # soon as the best timetable reaches it (the preferences are multiples of 0.5, which GLPK cannot close)
+                scale = integer_scale(coefficients)
+                self.backend.set_objective(columns, scale*coefficients)
+                result = self.backend.solve(time_limit=time_limit, mip_gap=mip_gap, start=values)
+                if result.objective is not None:
+                    result.objective /= scale
+                self.stages.append({"tier": tier, "status": result.status, "objective": result.objective, "gap": result.gap, "time": result.time})
+                print(f"Tier {n + 1} ({', '.join(tier)}): {result.status}, objective {result.objective}, {result.time:.2f}s")
+                if result.status not in ("optimal", "feasible"):
+                    break
+                values = result.values
+                # The next tiers cannot make this one worse
+                lower = result.objective - tolerance*max(1.0, abs(result.objective))
+                if n < len(self.level_rows):
+                    self.change_row(self.level_rows[n], columns, coefficients, lower, np.inf)
+                else:
+                    self.level_rows.append(self.add_row(columns, coefficients, lower, np.inf))
+        finally: # Back to the weighted objective without the rows of the tiers
+            self.backend.set_objective(columns, self.objective)
+            if len(self.level_rows) > 0:
+                self.set_row_bounds(self.level_rows, -np.inf, np.inf)
+
+        total_time = sum(stage["time"] for stage in self.stages)
+        if values is None:
+            self.result = solvers.SolveResult(self.stages[-1]["status"], time=total_time)
+        else:
+            status = "optimal" if all(stage["status"] == "optimal" for stage in self.stages) else "feasible"
+            self.result = solvers.SolveResult(status, float(values @ self.objective), None, total_time, values)
+        self.set_solution(self.keys[values > 0.5] if values is not None else None)
+        return self.result
+
+    def set_unavailable(self, i, d, h, unavailable=True):
+        """Makes proffessor i unavailable (or available again) at day d and hour h
+
+        Only the variables of that time are changed, the model is not built again."""
+        if self.available[i, d, h] == (not unavailable):
+            return
+        self.available = self.inp.writable("available")
+        self.available[i, d, h] = not unavailable
+        if self.backend is None: # The model is not built yet, it will be built with the new input
+            return
+        self.release_presolve()
+        self.release_symmetry()
+        self.update_variables([(i, d, h, c) for c in range(self.number_of_classes)])
+        self.update_strengthening()
+
+    def set_required_hours(self, i, c, hours):
+        """Changes the hours per week proffessor i has to teach class c, changing only the row of that pair"""
+        previous = self.inp.required_hours_per_professor_per_class[i, c]
+        self.inp.writable("required_hours_per_professor_per_class")[i, c] = hours
+        if self.backend is None:
+            return
+        self.release_presolve()
+        self.release_symmetry()
+        family = self.families["coverage"]
+        family["upper"][i*self.number_of_classes + c] = hours
+        if family["lower"] is not None: # The timetable is forced to be complete
+            family["lower"][i*self.number_of_classes + c] = hours
+        row = family["rows"].get(i*self.number_of_classes + c)
+        if row is not None:
+            self.set_row_bounds([row], -np.inf if family["lower"] is None else hours, hours)
+        if (previous > 0) != (hours > 0): # The variables of the pair are created or removed
+            self.update_variables([(i, d, h, c) for d in range(self.number_of_days) for h in range(self.number_of_hours)])
+        self.update_max_hours_per_day(i, c)
+        self.update_strengthening()
+
+    def set_max_hours_per_day(self, i, c, hours):
+        """Changes the hours per day proffessor i can teach class c, changing only the rows of that pair"""
+        previous = self.inp.max_hours_per_professor_per_class_per_day[i, c]
+        self.inp.writable("max_hours_per_professor_per_class_per_day")[i, c] = hours
+        if self.backend is None:
+            return
+        self.release_presolve()
+        self.release_symmetry()
+        if (previous > 0) != (hours > 0):
+            self.update_variables([(i, d, h, c) for d in range(self.number_of_days) for h in range(self.number_of_hours)])
+        self.update_max_hours_per_day(i, c)
+        self.update_strengthening()
+
+    def update_max_hours_per_day(self, i, c):
+        """Gives the rows of the daily limit of proffessor i for class c the bound of the current input"""
+        family = self.families["max_hours_per_day"]
+        groups = [(i*self.number_of_days + d)*self.number_of_classes + c for d in range(self.number_of_days)]
+        hours = min(self.inp.max_hours_per_professor_per_class_per_day[i, c], self.inp.required_hours_per_professor_per_class[i, c])
+        family["upper"][groups] = hours
+        rows = [family["rows"][g] for g in groups if g in family["rows"]]
+        if len(rows) > 0:
+            self.set_row_bounds(rows, -np.inf, hours)
+
+    def update_strengthening(self):
+        """Gives the rows of create_strengthening_constraints the bounds of the current input
+
+        The hours that can be taught change with the availability, the required hours and the daily limits,
+        so the bounds are computed again from the input (not from presolve, which is released by the edits)."""
+        if not self.strong:
+            return
+        for name, upper in self.strengthening_bounds().items():
+            family = self.families[name]
+            if name in ("professor_day", "class_day"): # Also the bound of the rows created later by add_variables
+                family["upper"] = upper.astype(float)
+            groups = np.array(list(family["rows"]), dtype=np.int64)
+            rows = np.array([family["rows"][g] for g in groups.tolist()], dtype=np.int64)
+            _, _, _, row_lower, row_upper = self.constraint_matrix()
+            changed = row_upper[rows] != upper[groups]
+            if changed.any():
+                self.set_row_bounds(rows[changed], row_lower[rows[changed]], upper[groups[changed]])
+
+    def release_symmetry(self):
+        """Removes the bounds of the symmetry breaking rows, since the classes or professors may not be identical anymore"""
+        if len(self.symmetry_rows) > 0:
+            rows, self.symmetry_rows = self.symmetry_rows, []
+            self.set_row_bounds(rows, -np.inf, np.inf)
+
+    def release_presolve(self):
+        """Frees the variables fixed to 0 by presolve, which may be needed once the input changes"""
+        self.problems = None
+        if len(self.presolve_fixed) > 0:
+            keys, self.presolve_fixed = self.presolve_fixed, []
+            self.update_variables(keys)
+
+    def set_weight(self, name, weight):
+        """Changes one of the weights of the objective (a key of self.params), changing only the objective"""
+        if name not in self.params:
+            raise ValueError(f"Unknown weight {name!r}, choose one of: {', '.join(self.params)}")
+        self.params[name] = weight
+        if self.backend is not None:
+            self.update_objective()
+
+    def set_priority(self, i, priority):
+        """Changes the extra priority of the preferences of proffessor i, changing only the objective"""
+        self.extra_priority[i] = priority
+        if self.backend is not None:
+            self.release_symmetry()
+            self.update_objective()
+
+    def update_objective(self):
+        """Builds the objective again and gives the coefficients that changed to the backend"""
+        previous = self.objective
+        self.set_objective()
+        changed = np.flatnonzero(self.objective != previous)
+        if len(changed) > 0:
+            self.backend.set_objective(changed, self.objective[changed])
+
+    def update_variables(self, keys):
+        """Brings the variables of keys (i, d, h, c) up to date with the availability and the required hours
+
+        Existing variables only get a new upper bound (0 if they cannot be used anymore),
+        variables that are missing in sparse mode and are needed now are added to the model."""
+        changed, new = [], []
+        for i, d, h, c in keys:
+            j = self.column((i, d, h, c))
+            upper = int(self.available[i, d, h] and self.inp.required_hours_per_professor_per_class[i, c] > 0
+                        and self.inp.max_hours_per_professor_per_class_per_day[i, c] > 0) # Same as presolve.usable
+            if j is None:
+                if upper > 0:
+                    new.append((i, d, h, c))
+            elif self.upper[j] != upper:
+                self.upper[j] = upper
+                changed.append(j)
+        if len(changed) > 0:
+            self.backend.set_col_upper(np.array(changed), self.upper[changed])
+        if len(new) > 0:
+            self.add_variables(new)
+
+    def add_variables(self, keys):
+        """Adds new variables (i, d, h, c) to the model, with their coefficients in the rows of every family
+
+        Rows are created for the groups that had no row before (e.g. a single variable that gets company)."""
+        columns = np.arange(len(self.keys), len(self.keys) + len(keys))
+        self.keys = np.concatenate([self.keys, np.array(keys, dtype=self.keys.dtype).reshape(-1, 4)])
+        self.K[tuple(self.keys[columns].T)] = columns
+        i, d, h, c = self.keys[columns].T
+        self.upper = np.concatenate([self.upper, self.available[i, d, h].astype(np.int64)])
+        self.set_objective()
 
+        first_row = self.number_of_rows
+        old_rows, old_cols = zip(*[self.extend_family(name, columns) for name in self.families])
+        old_rows, old_cols = np.concatenate(old_rows), np.concatenate(old_cols)
+        self.append_matrix(old_rows, old_cols, np.ones(len(old_rows)), np.zeros(0), np.zeros(0))
+        self.backend.add_columns(self.keys[columns], self.upper[columns], self.objective[columns], old_rows, old_cols, np.ones(len(old_rows)))
+
+        # The new rows already have their coefficients in the matrix, they are given to the backend now
+        rows, cols, vals, lower, upper = self.constraint_matrix()
+        for row in range(first_row, self.number_of_rows):
+            in_row = rows == row
+            self.backend.add_row(row, cols[in_row], vals[in_row], lower[row], upper[row])
+
+    @profiling.profiled
     def create_physical_constraints(self):
         """Contraints of the type:
         -No proffessor can teach 2 classes at the same time
@@ -49,124 +623,131 @@ class Timetable:
         """
 
         # No proffessor can teach 2 classes at the same time
-        for i in range(self.number_of_profs):
-            for d in range(self.number_of_days):
-                for h in range(self.number_of_hours):
-                    sum(self.K[i][d][h]) <= 1
+        self.add_rows("professor_slot", lambda i, d, h, c: (i*self.number_of_days + d)*self.number_of_hours + h,
+                      np.ones(self.number_of_profs*self.number_of_days*self.number_of_hours), single=False) # A single variable is already bounded by 1
         
         # No class can be taught by 2 proffessors at the same time
-        for d in range(self.number_of_days):
-            for h in range(self.number_of_hours):
-                for c in range(self.number_of_classes):
-                    sum(self.K[:, d, h, c]) <= 1
+        self.add_rows("class_slot", lambda i, d, h, c: (d*self.number_of_hours + h)*self.number_of_classes + c,
+                      np.ones(self.number_of_days*self.number_of_hours*self.number_of_classes), single=False)
     
+    @profiling.profiled
     def create_material_coverage__constraints(self):
         """Contraints of the type:
         -A class can only be taught x hours per week by a proffessor, as dictated by the material needed to be covered
         Are added here        
         """
         # A proffessor i can only teach x hours per week for class l according to the input data
-        for i in range(self.number_of_profs):
-            for c in range(self.number_of_classes):
-
-
-                all_hours_in_week = [self.K[i][d][h][c] for d in range(self.number_of_days) for h in range(self.number_of_hours)]
-                # sum(all_hours_in_week) == inp.required_hours_per_professor_per_class[i][c] # Use to force the timetable to be complete
-                sum(all_hours_in_week) <= inp.required_hours_per_professor_per_class[i][c] # Use if you want to get uncompleted timetables as result
-
+        required_hours = np.array(self.inp.required_hours_per_professor_per_class).ravel()
+        group = lambda i, d, h, c: i*self.number_of_classes + c
+        if self.complete: # Forces the timetable to be complete
+            self.add_rows("coverage", group, required_hours, lower=required_hours)
+        else: # Allows uncompleted timetables as result
+            self.add_rows("coverage", group, required_hours)
+
+    @profiling.profiled
     def create_max_hours_per_day_constraints(self):
         """Contraints of the type:
         -A proffessor can only teach up to x hours per day for a class
         Are added here        
         """
-        for i in range(self.number_of_profs):
-            for d in range(self.number_of_days):
-                for c in range(self.number_of_classes):
-                    sum(self.K[i, d, :, c]) <= inp.max_hours_per_professor_per_class_per_day[i][c]
+        # A limit above the required hours of the week is tightened to them
+        max_hours = np.minimum(self.inp.max_hours_per_professor_per_class_per_day, self.inp.required_hours_per_professor_per_class)
+        max_hours = np.repeat(max_hours[:, np.newaxis, :], self.number_of_days, axis=1) # Same limit for every day
+        self.add_rows("max_hours_per_day", lambda i, d, h, c: (i*self.number_of_days + d)*self.number_of_classes + c, max_hours.ravel())
 
+    @profiling.profiled
     def create_unavailable_hours_constraints(self):
         """Contraints of the type:
         -A proffessor cannot teach any class at a specific time
         Are added here        
         """
-        for i in range(self.number_of_profs):
-            for d in range(self.number_of_days):
-                for h in range(self.number_of_hours):
-                    if (d, h) in inp.unavailable_hours_per_professor[i]:   
-                        sum(self.K[i][d][h]) ==0
-
-
-    def set_objective(self):
-
-        
-        
-        params = {
-            "coverage": 100,
-            "preferred_days": 2,
-            "avoidance_days": 2,
-            "preferred_hours": 0.5,
-            "avoidance_hours": 0.5,
-            
-        }
-
-        # Maximize the number of classes taught
-        coverage_terms = [self.K[i][d][h][c] for i in range(self.number_of_profs) for d in range(self.number_of_days) for h in range(self.number_of_hours) for c in range(self.number_of_classes)]
+        if self.sparse: # No variables were created for the unavailable hours
+            return
+        # Fixing the variables to 0 instead of adding a row per unavailable hour keeps the model smaller,
+        # together with the other variables fixed by presolve
+        self.upper[~self.usable[tuple(self.keys.T)]] = 0
 
-        # If we want to give a higher priority to certain professors we can add a weight to the choices of those proffessors:
-        extra_priority =[1 for _ in range(self.number_of_profs)]
-        # extra_priority[0] = 0
-        # extra_priority[0] = 1
-        extra_priority[0] = 2
 
-        # Add preferences like some professors prefer to teach at certain days
-        preferences_days_terms = []
-        for i in range(self.number_of_profs):
-            for d in inp.preferred_days_per_professor[i]:
-                for h in range(self.number_of_hours):
-                    for c in range(self.number_of_classes):
-                        preferences_days_terms.append(extra_priority[i]*self.K[i][d][h][c])
-            
-        
-        # Add preferences like some professors prefer not to teach at certain days
-        avoidance_days_terms = []
-        for i in range(self.number_of_profs):
-            for d in inp.days_to_avoid_per_professor[i]:
-                for h in range(self.number_of_hours):
-                    for c in range(self.number_of_classes):
-                        avoidance_days_terms.append(extra_priority[i]*self.K[i][d][h][c])
-        
-        # Add preferences like some professors prefer to teach at certain hours
-        preferences_hours_terms = []
-        for i in range(self.number_of_profs):
-            for d in range(self.number_of_days):
-                for h in inp.preferred_hours_per_professor[i]:
-                    for c in range(self.number_of_classes):
-                        preferences_hours_terms.append(extra_priority[i]*self.K[i][d][h][c])
-        
-        # Add preferences like some professors prefer not to teach at certain hours
-        avoidance_hours_terms = []
-        for i in range(self.number_of_profs):
-            for d in range(self.number_of_days):
-                for h in inp.hours_to_avoid_per_professor[i]:
-                    for c in range(self.number_of_classes):
-                        avoidance_hours_terms.append(extra_priority[i]*self.K[i][d][h][c])
-        
+    @profiling.profiled
+    def create_symmetry_breaking_constraints(self):
+        """Contraints of the type:
+        -Of two identical classes (or proffessors) the first one starts first
+        Are added here (see symmetry.py)
+        """
+        self.symmetry_groups = symmetry.groups(self.inp, self.extra_priority)
+        rows = symmetry.breaking_rows(self, *self.symmetry_groups)
+        if len(rows) == 0:
+            return
+        first_row = self.number_of_rows
+        self.append_matrix(np.repeat(np.arange(first_row, first_row + len(rows)), [len(cols) for cols, _ in rows]),
+                           np.concatenate([cols for cols, _ in rows]), np.concatenate([vals for _, vals in rows]),
+                           np.full(len(rows), -np.inf), np.zeros(len(rows)))
+        self.symmetry_rows = list(range(first_row, self.number_of_rows))
+
+    def strengthening_bounds(self):
+        """The most hours that can be taught per proffessor and day, day and class, proffessor day and class and
+        proffessor and class, by the group ids of the families (see presolve.capacities)"""
+        professor_day, day_class, pair_day, pair = presolve.capacities(self.inp)
+        return {"professor_day": professor_day.ravel(), "class_day": day_class.ravel(),
+                "max_hours_per_day": pair_day.ravel(), "coverage": pair.ravel()}
+
+    @profiling.profiled
+    def create_strengthening_constraints(self):
+        """Contraints of the type:
+        -A proffessor can only teach up to x hours per day, the hours at which they are available and have a class to teach
+        -A class can only be taught up to x hours per day, the hours at which one of its proffessors is available
+        Are added here, and the rows of the daily limits and the weekly hours get the bounds that can really be reached
 
+        Every timetable satisfies them already, but the LP relaxation does not, so the solver has less to branch on.
+        The GLPK backend also turns on its clique cuts for these models (the slot rows are cliques).
+        """
+        bounds = self.strengthening_bounds()
+        self.add_rows("professor_day", lambda i, d, h, c: i*self.number_of_days + d, bounds["professor_day"], single=False)
+        self.add_rows("class_day", lambda i, d, h, c: d*self.number_of_classes + c, bounds["class_day"], single=False)
 
+        # Implied bounds: a pair cannot be taught more hours than it has available, on a day or in the week.
+        # Only the rows change, family["upper"] keeps the bounds of the input for the edits
+        row_upper = self.constraint_matrix()[4]
+        for name in ["max_hours_per_day", "coverage"]:
+            groups = np.array(list(self.families[name]["rows"]), dtype=np.int64)
+            rows = np.array([self.families[name]["rows"][g] for g in groups.tolist()], dtype=np.int64)
+            row_upper[rows] = np.minimum(row_upper[rows], bounds[name][groups])
 
-        
-        
-            
+    def objective_terms(self):
+        """Returns the terms of the objective as one coefficient per variable, by name (the names of self.params)
 
-        objective_sum = params["coverage"]*sum(coverage_terms)
-        objective_sum += params["preferred_days"]*sum(preferences_days_terms)
-        objective_sum -= params["avoidance_days"]*sum(avoidance_days_terms)
-        objective_sum += params["preferred_hours"]*sum(preferences_hours_terms)
-        objective_sum -= params["avoidance_hours"]*sum(avoidance_hours_terms)
+        The preferences are multiplied by the extra priority of the proffessor, the avoidances are negative."""
+        i, d, h, _ = self.keys.T
+        priority = np.asarray(self.extra_priority, dtype=float)[:, np.newaxis] # One row per proffessor
 
-        self.model.maximize(objective_sum)
-        
+        # Maximize the number of classes taught
+        terms = {"coverage": np.ones(len(self.keys))}
+
+        # Preferences like some professors prefer (or prefer not) to teach at certain days or hours,
+        # as (professors x days) and (professors x hours) coefficients, picked for every variable
+        masks = timetable_input.preference_masks(self.inp) # Same masks as verify.score
+        terms["preferred_days"] = (priority*masks["preferred_days"])[i, d]
+        terms["avoidance_days"] = -(priority*masks["avoidance_days"])[i, d]
+        terms["preferred_hours"] = (priority*masks["preferred_hours"])[i, h]
+        terms["avoidance_hours"] = -(priority*masks["avoidance_hours"])[i, h]
+        return terms
+
+    def weighted_objective(self, weights, terms=None):
+        """Returns the coefficients of the objective sum(weight*term) for weights, a dict {term name: weight}"""
+        terms = self.objective_terms() if terms is None else terms
+        coefficients = np.zeros(len(self.keys))
+        for name, weight in weights.items():
+            if name not in terms:
+                raise ValueError(f"Unknown objective term {name!r}, choose one of: {', '.join(terms)}")
+            coefficients += weight*terms[name]
+        return coefficients
+
+    @profiling.profiled
+    def set_objective(self):
+        """The objective is stored as one coefficient per variable, so that every solver backend can load it"""
+        self.objective = self.weighted_objective(self.params)
 
+    @profiling.profiled
     def print_classes(self):
         """Prints the timetable for each class
         
@@ -184,28 +765,18 @@ class Timetable:
         if not self.solved:
             print("Model has not been solved yet")
             return
-        class_names = ["Class A", "Class B", "Class C"]
         print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~\n")
+        # Proffesor teaching class c at day j and hour k, -1 if there is none
+        time_slots = np.where(self.grid.any(axis=0), self.grid.argmax(axis=0), -1).transpose(2, 1, 0) # class x hour x day
+        header = "H\\D:\t" + "".join(f"{self.inp.days_initials[i]}\t" for i in range(self.number_of_days)) + "\n"
         for c in range(self.number_of_classes):
-            out=f"{class_names[c]}:\n\n"
-            time_slots = [[-1 for _ in range(self.number_of_hours)] for _ in range(self.number_of_days)]
-            for i in range(self.number_of_profs):
-                for j in range(self.number_of_days):
-                    for k in range(self.number_of_hours):
-                        if self.K[i][j][k][c].primal == 1: # If proffesor i teaches class c at day j and hour k
-                            time_slots[j][k] = i
-            out += f"H\\D:\t"
-            for i in range(self.number_of_days):
-                out += f"{inp.days_initials[i]}\t"
-            out += "\n"
-            for i in range(self.number_of_hours):
-                out += f"{i}\t"
-                for j in range(self.number_of_days):
-                    out += f"{time_slots[j][i]}\t"
-                out += "\n"
+            out = f"Class {self.inp.class_names[c]}:\n\n" + header
+            for i, slots in enumerate(time_slots[c].tolist()):
+                out += f"{i}\t" + "".join(f"{p}\t" for p in slots) + "\n"
             out+="~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~\n"
             print(out)
 
+    @profiling.profiled
     def print_professors(self): 
         """Prints the timetable for each professor
         
@@ -232,47 +803,59 @@ class Timetable:
 
         first_line = "P\\D\t|\t"
         for i in range(self.number_of_days):
-            first_line += f"{inp.days_initials[i]}\t|\t"
+            first_line += f"{self.inp.days_initials[i]}\t|\t"
         first_line = first_line[:-1]
         first_line += "Preferred/Avoided hours"
-        out =  "\n"
-        pad_after="" if inp.number_of_hours>=6 else " "
+        pad_after="" if self.inp.number_of_hours>=6 else " "
+
+        # The text of every (professor, day, hour) cell: the class taught, X if unavailable or - if free
+        names = np.array([" " + name + pad_after for name in self.inp.class_names] + [" X" + pad_after, " -" + pad_after])
+        cell = np.where(self.grid.any(axis=3), self.grid.argmax(axis=3),
+                        np.where(self.available, len(self.inp.class_names) + 1, len(self.inp.class_names)))
+        cells = names[cell].tolist()
+        masks = timetable_input.preference_masks(self.inp)
+        preferred_days, avoided_days = masks["preferred_days"], masks["avoidance_days"]
+
+        print(first_line + "\n")
         for i in range(self.number_of_profs):
-            out+=f"Prof {i}\t"
+            out = f"Prof {i}\t"
             for d in range(self.number_of_days):
-                out+="|"
+                out += "|"
                 if colors:
-                    if d in inp.preferred_days_per_professor[i]:
-                        out+=GREEN
-                    elif d in inp.days_to_avoid_per_professor[i]:
-                        out+=RED
-
-                for h in range(self.number_of_hours):
-                    flag = [ self.K[i][d][h][c].primal for c in range(self.number_of_classes)]
-                    if sum(flag) == 0:
-                        if (d, h) in inp.unavailable_hours_per_professor[i]:    
-                            out+=" X" + pad_after
-                        else:
-                            out+=" -" + pad_after
-                    else:
-                        index = flag.index(1)
-                        out+=" " + inp.class_names[index] + pad_after
+                    if preferred_days[i, d]:
+                        out += GREEN
+                    elif avoided_days[i, d]:
+                        out += RED
+                out += "".join(cells[i][d])
                 if colors:
-                    out+=RESET
-                if inp.number_of_hours>=6:                  
-                    out+="\t"
+                    out += RESET
+                if self.inp.number_of_hours>=6:                  
+                    out += "\t"
             if colors:
-                preferred_hours = inp.preferred_hours_per_professor[i]
-                avoided_hours = inp.hours_to_avoid_per_professor[i]
-                preferred_hours_print = ",".join([str(x) for x in preferred_hours])
-                avoided_hours_print = ",".join([str(x) for x in avoided_hours])
-                out+=f"|  {GREEN}{preferred_hours_print}{RESET} | {RED}{avoided_hours_print}{RESET}\n"
-            
-
-        print(first_line+"\n"+out)
+                preferred_hours_print = ",".join([str(x) for x in self.inp.preferred_hours_per_professor[i]])
+                avoided_hours_print = ",".join([str(x) for x in self.inp.hours_to_avoid_per_professor[i]])
+                out += f"|  {GREEN}{preferred_hours_print}{RESET} | {RED}{avoided_hours_print}{RESET}\n"
+            print(out, end="") # One professor at a time
+        print()
 
         
 
+    def preference_counts(self):
+        """Returns the hours every professor teaches on their preferred/avoided days/hours and their weekly hours
+
+        A dict of arrays with one value per professor, computed from self.grid."""
+        per_day = self.grid.sum(axis=(2, 3), dtype=np.int64) # professor x day
+        per_hour = self.grid.sum(axis=(1, 3), dtype=np.int64) # professor x hour
+        masks = timetable_input.preference_masks(self.inp)
+        return {
+            "preferred_days": (per_day*masks["preferred_days"]).sum(axis=1),
+            "avoided_days": (per_day*masks["avoidance_days"]).sum(axis=1),
+            "preferred_hours": (per_hour*masks["preferred_hours"]).sum(axis=1),
+            "avoided_hours": (per_hour*masks["avoidance_hours"]).sum(axis=1),
+            "total_hours": np.sum(self.inp.required_hours_per_professor_per_class, axis=1),
+        }
+
+    @profiling.profiled
     def print_stats(self):
         """Prints the statistics of the timetable
         Preferred Days...
@@ -284,204 +867,108 @@ class Timetable:
             return
         print("\n//////////////////////////////////////\n")
         print("Printing statistics\n")
-
-
-        print("Preferred Days")
-        counter_preferred_days=0
-        for i in range(self.number_of_profs):
-            preffered_days = inp.preferred_days_per_professor[i]
-
-            counter=0
-            for preferred_day in preffered_days:
-                for h in range(self.number_of_hours):
-                    for c in range(self.number_of_classes):
-                        if self.K[i][preferred_day][h][c].primal == 1:
-                            counter+=1
-            counter_preferred_days+=counter
-            total_hours= sum(inp.required_hours_per_professor_per_class[i])
-            if total_hours==0:
-                continue
-            print(f"Professor {i} teaches {counter} classes on their preferred days. Total hours: {total_hours}")
-        print("\n////////\n")
-        print("Avoided Days")
-        counter_avoided_days=0
-        for i in range(self.number_of_profs):
-            avoided_days = inp.days_to_avoid_per_professor[i]
-
-            counter=0
-            for avoided_day in avoided_days:
-                for h in range(self.number_of_hours):
-                    for c in range(self.number_of_classes):
-                        if self.K[i][avoided_day][h][c].primal == 1:
-                            counter+=1
-            counter_avoided_days+=counter
-            total_hours= sum(inp.required_hours_per_professor_per_class[i])
-            if total_hours==0:
-                continue
-            print(f"Professor {i} teaches {counter} classes on their avoided days. Total hours: {total_hours}")
+        counts = self.preference_counts()
+        total_hours = counts["total_hours"].tolist()
+
+        for n, (name, title, text) in enumerate([("preferred_days", "Preferred Days", "preferred days"),
+                                                 ("avoided_days", "Avoided Days", "avoided days"),
+                                                 ("preferred_hours", "Preferred Hours", "preferred hours"),
+                                                 ("avoided_hours", "Avoided Hours", "avoided hours")]):
+            if n > 0:
+                print("\n////////\n")
+            print(title)
+            for i, counter in enumerate(counts[name].tolist()):
+                if total_hours[i]==0:
+                    continue
+                print(f"Professor {i} teaches {counter} classes on their {text}. Total hours: {total_hours[i]}")
         
         print("\n////////\n")
-        print("Preferred Hours")
-        counter_preferred_hours=0
-        for i in range(self.number_of_profs):
-            preferred_hours = inp.preferred_hours_per_professor[i]
-
-            counter=0
-            for preferred_hour in preferred_hours:
-                for d in range(self.number_of_days):
-                    for c in range(self.number_of_classes):
-                        if self.K[i][d][preferred_hour][c].primal == 1:
-                            counter+=1
-            counter_preferred_hours+=counter
-            total_hours= sum(inp.required_hours_per_professor_per_class[i])
-            if total_hours==0:
-                continue
-            print(f"Professor {i} teaches {counter} classes on their preferred hours. Total hours: {total_hours}")
+        print(f"Number of hours taught in avoided days: {counts['avoided_days'].sum()}")
+        print(f"Number of hours taught in preferred days: {counts['preferred_days'].sum()}")
+        print(f"Number of hours taught in avoided hours: {counts['avoided_hours'].sum()}")
+        print(f"Number of hours taught in preferred hours: {counts['preferred_hours'].sum()}")
+
+    @profiling.profiled
+    def statistics(self):
+        """Returns the totals of print_stats and the coverage of the required hours as a dict"""
+        counts = self.preference_counts()
+        hours_taught = int(self.grid.sum(dtype=np.int64))
+        required_hours = int(counts["total_hours"].sum())
+        stats = {
+            "hours_taught": hours_taught,
+            "required_hours": required_hours,
+            "coverage": hours_taught/required_hours if required_hours > 0 else 1.0,
+        }
+        for name in ["preferred_days", "avoided_days", "preferred_hours", "avoided_hours"]:
+            stats[name] = int(counts[name].sum())
+        return stats
 
-        print("\n////////\n")
-        print("Avoided Hours")
-        counter_avoided_hours = 0
-        for i in range(self.number_of_profs):
-            avoided_hours = inp.hours_to_avoid_per_professor[i]
-
-            counter=0
-            for avoided_hour in avoided_hours:
-                for d in range(self.number_of_days):
-                    for c in range(self.number_of_classes):
-                        if self.K[i][d][avoided_hour][c].primal == 1:
-                            counter+=1
-            counter_avoided_hours += counter
-            total_hours= sum(inp.required_hours_per_professor_per_class[i])
-            if total_hours==0:
-                continue
-            print(f"Professor {i} teaches {counter} classes on their avoided hours. Total hours: {total_hours}")
-        
-        print("\n////////\n")
-        print(f"Number of hours taught in avoided days: {counter_avoided_days}")
-        print(f"Number of hours taught in preferred days: {counter_preferred_days}")
-        print(f"Number of hours taught in avoided hours: {counter_avoided_hours}")
-        print(f"Number of hours taught in preferred hours: {counter_preferred_hours}")
+    @profiling.profiled
+    def show_stats(self, path=None):
+        """Uses matplotlib to visualize the statistics of the timetable
 
-    def show_stats(self):
-        """Uses matplotlib to visualize the statistics of the timetable"""
+        If path is given the charts are saved to that file (.png, .svg, ... from the extension) instead of
+        being shown, without a window, so it also works without a display."""
         if not self.solved:
             print("Model has not been solved yet")
             return
         
-        import matplotlib.pyplot as plt
         from matplotlib.ticker import MaxNLocator
 
-        fig, axs = plt.subplots(2, 2, figsize=(10, 8))
+        if path is None:
+            import matplotlib.pyplot as plt
+            fig, axs = plt.subplots(2, 2, figsize=(10, 8))
+        else: # A figure that is not managed by pyplot does not need a GUI backend
+            from matplotlib.figure import Figure
+            fig = Figure(figsize=(10, 8))
+            axs = fig.subplots(2, 2)
         fig.suptitle('Stats')
 
-        plt.subplots_adjust(hspace=0.4, wspace=0.4)
-
-        # Plot the number of classes taught by each professor on preferred days
-        preferred_days_stats = []
-        for i in range(self.number_of_profs):
-            preferred_days = inp.preferred_days_per_professor[i]
-            total_hours= sum(inp.required_hours_per_professor_per_class[i])
-            if total_hours==0:
-                continue
-            counter=0
-            for preferred_day in preferred_days:
-                for h in range(self.number_of_hours):
-                    for c in range(self.number_of_classes):
-                        if self.K[i][preferred_day][h][c].primal == 1:
-                            counter+=1
-
-            preferred_days_stats.append(counter/total_hours if total_hours!=0 else 0)
-
-        axs[0, 0].bar(range(len(preferred_days_stats)), preferred_days_stats)
-        axs[0, 0].set_title('Percentage of Hours Taught on Preferred Days')
-        axs[0, 0].set_xlabel('Professor id')
-        axs[0, 0].set_ylabel('Percentage of weekly hours')
-        axs[0, 0].xaxis.set_major_locator(MaxNLocator(integer=True))
-        # axs[0, 0].yaxis.set_major_locator(MaxNLocator(integer=True))
-
-        # Plot the number of classes taught by each professor on avoided days
-        avoided_days_stats = []
-        for i in range(self.number_of_profs):
-            avoided_days = inp.days_to_avoid_per_professor[i]
-            total_hours= sum(inp.required_hours_per_professor_per_class[i])
-            if total_hours==0:
-                continue
-            counter=0
-            for avoided_day in avoided_days:
-                for h in range(self.number_of_hours):
-                    for c in range(self.number_of_classes):
-                        if self.K[i][avoided_day][h][c].primal == 1:
-                            counter+=1
-            avoided_days_stats.append(counter/total_hours if total_hours!=0 else 0)
-        
-
-        axs[0, 1].bar(range(len(avoided_days_stats)), avoided_days_stats)
-        axs[0, 1].set_title('Percentage of Hours Taught on Avoided Days')
-        axs[0, 1].set_xlabel('Professor id')
-        axs[0, 1].set_ylabel('Percentage of weekly hours')
-        axs[0, 1].xaxis.set_major_locator(MaxNLocator(integer=True))
-        # axs[0, 1].yaxis.set_major_locator(MaxNLocator(integer=True))
-
-
-        # Plot the number of classes taught by each professor on preferred hours
-        preferred_hours_stats = []
-        for i in range(self.number_of_profs):
-            preferred_hours = inp.preferred_hours_per_professor[i]
-            total_hours= sum(inp.required_hours_per_professor_per_class[i])
-            if total_hours==0:
-                continue
-            counter=0
-            for preferred_hour in preferred_hours:
-                for j in range(self.number_of_days):
-                    for c in range(self.number_of_classes):
-                        if self.K[i][j][preferred_hour][c].primal == 1:
-                            counter+=1
-            preferred_hours_stats.append(counter/total_hours if total_hours!=0 else 0)
-
-        axs[1, 0].bar(range(len(preferred_hours_stats)), preferred_hours_stats)
-        axs[1, 0].set_title('Percentage of Hours Taught on Preferred Hours')
-        axs[1, 0].set_xlabel('Professor id')
-        axs[1, 0].set_ylabel('Percentage of weekly hours')
-        axs[1, 0].xaxis.set_major_locator(MaxNLocator(integer=True))
-        # axs[1, 0].yaxis.set_major_locator(MaxNLocator(integer=True))
-
-        # Plot the number of classes taught by each professor on avoided hours
-        avoided_hours_stats = []
-        for i in range(self.number_of_profs):
-            avoided_hours = inp.hours_to_avoid_per_professor[i]
-            total_hours= sum(inp.required_hours_per_professor_per_class[i])
-            if total_hours==0:
-                continue
-            counter=0
-            for avoided_hour in avoided_hours:
-                for j in range(self.number_of_days):
-                    for c in range(self.number_of_classes):
-                        if self.K[i][j][avoided_hour][c].primal == 1:
-                            counter+=1
-            avoided_hours_stats.append(counter/total_hours if total_hours!=0 else 0)
-
-        axs[1, 1].bar(range(len(avoided_hours_stats)), avoided_hours_stats)
-        axs[1, 1].set_title('Percentage of Hours Taught on Avoided Hours')
-        axs[1, 1].set_xlabel('Professor id')
-        axs[1, 1].set_ylabel('Percentage of weekly hours')
-        axs[1, 1].xaxis.set_major_locator(MaxNLocator(integer=True))
-        # axs[1, 1].yaxis.set_major_locator(MaxNLocator(integer=True))
-        
-
+        fig.subplots_adjust(hspace=0.4, wspace=0.4)
 
+        # Plot the percentage of the weekly hours of each professor (with weekly hours) taught on preferred/avoided days/hours
+        counts = self.preference_counts()
+        teaching = counts["total_hours"] > 0
+        for ax, name, title in [(axs[0, 0], "preferred_days", 'Percentage of Hours Taught on Preferred Days'),
+                                (axs[0, 1], "avoided_days", 'Percentage of Hours Taught on Avoided Days'),
+                                (axs[1, 0], "preferred_hours", 'Percentage of Hours Taught on Preferred Hours'),
+                                (axs[1, 1], "avoided_hours", 'Percentage of Hours Taught on Avoided Hours')]:
+            stats = counts[name][teaching]/counts["total_hours"][teaching]
+            ax.bar(range(len(stats)), stats)
+            ax.set_title(title)
+            ax.set_xlabel('Professor id')
+            ax.set_ylabel('Percentage of weekly hours')
+            ax.xaxis.set_major_locator(MaxNLocator(integer=True))
 
-
-
-        plt.show()
+        if path is None:
+            plt.show()
+        else:
+            fig.savefig(path)
 
 
 if __name__ == '__main__':
     
-    timetable = Timetable(inp.number_of_professors, inp.number_of_days, inp.number_of_hours, inp.number_of_classes)
-    timetable.solve()
+    profile_path = os.environ.get("TIMETABLE_PROFILE") # e.g. TIMETABLE_PROFILE=metrics.json python main.py
+    if profile_path:
+        profiling.enable()
+
+    if len(sys.argv) > 1: # An input file: json, yaml, a directory of csv files or a compiled .npz (see timetable_input.py)
+        inp = timetable_input.load(sys.argv[1])
+    else:
+        # import input_data as inp
+        # import input_data_non_complete as inp
+        import input_data_real as inp
+
+    # The model is only built if this input has not been solved before
+    timetable = Timetable(inp, build=False)
+    timetable.solve(cache=SolutionCache())
     timetable.print_stats()
     timetable.print_classes()
     
     timetable.print_professors()
 
     timetable.show_stats()
+
+    if profile_path:
+        profiling.default_profiler.print_summary()
+        profiling.default_profiler.dump_json(profile_path)
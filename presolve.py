@@ -0,0 +1,182 @@
+"""Fast checks of the input before the model is built, and the variables that they fix to 0
+
+The checks only count hours on the input arrays, so they take milliseconds where the solver may need minutes
+to find out that there is no complete timetable (every required hour taught, Timetable(complete=True)):
+    - a professor has to teach a class more hours than they can (availability, max hours per day)
+    - a professor has to teach more hours than they can (they teach one class at a time)
+    - a class needs more hours than the hours at which one of its professors is available
+For a complete timetable the hours that are forced are also followed: if a class needs every hour at which
+one of its professors is available and only one of them is available at some hour, that professor teaches
+the class at that hour, so they teach nothing else then, and so on. This finds conflicts like two classes
+that both need the same professor at the same hour, and fixes more variables to 0.
+
+Every problem is a dict with the constraint family of main.Timetable that cannot be satisfied
+("coverage", "professor_slot", "class_slot" or "max_hours_per_day"), the professor, class, day and hour
+it is about (None if it is not about one) and a message.
+
+Usage:
+    python presolve.py [input] [--complete]     (input_data_non_complete by default)
+"""
+import argparse
+import importlib
+import os
+
+import numpy as np
+
+import timetable_input
+
+
+def usable(inp):
+    """Returns a (professors x days x hours x classes) bool array, False for the variables that are 0 in every timetable
+
+    A professor teaches a class only if they have required hours and a daily limit for it and are available."""
+    required_hours = np.asarray(inp.required_hours_per_professor_per_class)
+    max_hours = np.asarray(inp.max_hours_per_professor_per_class_per_day)
+    pairs = (required_hours > 0) & (max_hours > 0)
+    return pairs[:, np.newaxis, np.newaxis, :] & np.asarray(inp.available)[:, :, :, np.newaxis]
+
+
+def capacities(inp, mask=None):
+    """Returns the most hours that can be taught with the variables of mask (usable(inp) by default) as arrays:
+    (per professor and day, per day and class, per professor, day and class, per professor and class)"""
+    mask = usable(inp) if mask is None else mask
+    required_hours = np.asarray(inp.required_hours_per_professor_per_class)
+    max_hours = np.minimum(inp.max_hours_per_professor_per_class_per_day, required_hours)
+    pair_day = np.minimum(mask.sum(axis=2), max_hours[:, np.newaxis, :]) # professors x days x classes
+    professor_day = np.minimum(mask.any(axis=3).sum(axis=2), pair_day.sum(axis=2))
+    day_class = np.minimum(mask.any(axis=0).sum(axis=1), pair_day.sum(axis=0))
+    pair = np.minimum(pair_day.sum(axis=1), required_hours)
+    return professor_day, day_class, pair_day, pair
+
+
+def problem(constraint, message, professor=None, class_=None, day=None, hour=None):
+    return {"constraint": constraint, "professor": professor, "class": class_, "day": day, "hour": hour, "message": message}
+
+
+def slot_name(inp, d, h):
+    return f"{inp.days_initials[d]} hour {h}"
+
+
+def count_problems(inp, mask):
+    """The required hours that cannot be taught with the variables of mask, counted per pair, professor and class"""
+    required_hours = np.asarray(inp.required_hours_per_professor_per_class)
+    max_hours = np.asarray(inp.max_hours_per_professor_per_class_per_day)
+    problems = []
+
+    # Hours per week a professor can teach a class: on every day the available hours, up to the daily limit
+    hours_per_day = np.minimum(mask.sum(axis=2), max_hours[:, np.newaxis, :]) # professors x days x classes
+    pair_capacity = hours_per_day.sum(axis=1)
+    for i, c in np.argwhere(pair_capacity < required_hours).tolist():
+        problems.append(problem("coverage", f"Professor {i} has to teach class {inp.class_names[c]} {required_hours[i, c]} hours "
+                                            f"but can teach it at most {pair_capacity[i, c]} "
+                                            f"({mask[i, :, :, c].sum()} hours available, at most {max_hours[i, c]} per day)",
+                                professor=i, class_=c))
+
+    # A professor teaches one class at a time, so on every day at most the hours at which they can teach any class
+    professor_capacity = np.minimum(mask.any(axis=3).sum(axis=2), hours_per_day.sum(axis=2)).sum(axis=1)
+    for i in np.flatnonzero(professor_capacity < required_hours.sum(axis=1)).tolist():
+        problems.append(problem("professor_slot", f"Professor {i} has to teach {required_hours[i].sum()} hours "
+                                                  f"but can teach at most {professor_capacity[i]}", professor=i))
+
+    # A class is taught by one professor at a time, so at most at the hours at which one of its professors is available
+    slots = mask.any(axis=0) # days x hours x classes
+    for c in np.flatnonzero(slots.sum(axis=(0, 1)) < required_hours.sum(axis=0)).tolist():
+        empty = [slot_name(inp, d, h) for d, h in np.argwhere(~slots[:, :, c]).tolist()]
+        problems.append(problem("class_slot", f"Class {inp.class_names[c]} needs {required_hours[:, c].sum()} hours "
+                                              f"but has a professor available at only {slots[:, :, c].sum()} "
+                                              f"(none at {', '.join(empty)})", class_=c))
+    return problems
+
+
+def forced_problems(inp, forced):
+    """The constraints broken by the assignments that every complete timetable has to make"""
+    required_hours = np.asarray(inp.required_hours_per_professor_per_class)
+    max_hours = np.asarray(inp.max_hours_per_professor_per_class_per_day)
+    problems = []
+    for i, d, h in np.argwhere(forced.sum(axis=3) > 1).tolist():
+        classes = ", ".join(inp.class_names[c] for c in np.flatnonzero(forced[i, d, h]).tolist())
+        problems.append(problem("professor_slot", f"Professor {i} is the only one who can teach classes {classes} "
+                                                  f"at {slot_name(inp, d, h)}", professor=i, day=d, hour=h))
+    for d, h, c in np.argwhere(forced.sum(axis=0) > 1).tolist():
+        professors = ", ".join(map(str, np.flatnonzero(forced[:, d, h, c]).tolist()))
+        problems.append(problem("class_slot", f"Professors {professors} all need every hour at which they can teach "
+                                              f"class {inp.class_names[c]}, including {slot_name(inp, d, h)}", class_=c, day=d, hour=h))
+    for i, c in np.argwhere(forced.sum(axis=(1, 2)) > required_hours).tolist():
+        problems.append(problem("coverage", f"Professor {i} is the only one who can teach class {inp.class_names[c]} at "
+                                            f"{forced[i, :, :, c].sum()} hours but has to teach it {required_hours[i, c]}",
+                                professor=i, class_=c))
+    for i, d, c in np.argwhere(forced.sum(axis=2) > max_hours[:, np.newaxis, :]).tolist():
+        problems.append(problem("max_hours_per_day", f"Professor {i} is the only one who can teach class {inp.class_names[c]} "
+                                                     f"at {forced[i, d, :, c].sum()} hours on {inp.days_initials[d]} "
+                                                     f"but at most {max_hours[i, c]} per day", professor=i, class_=c, day=d))
+    return problems
+
+
+def propagate(inp, mask):
+    """Fixes to 0 the variables that are 0 in every complete timetable, following the hours that are forced
+
+    Returns the new mask and the problems found (the mask is not reduced further once there is one)."""
+    required_hours = np.asarray(inp.required_hours_per_professor_per_class)
+    max_hours = np.asarray(inp.max_hours_per_professor_per_class_per_day)
+    mask = mask.copy()
+    while True:
+        # A class that needs every hour at which one of its professors is available is taught at all of them,
+        # by the professor if only one is available
+        full = mask.any(axis=0).sum(axis=(0, 1)) == required_hours.sum(axis=0)
+        forced = mask & ((mask.sum(axis=0) == 1) & full)[np.newaxis]
+        # A professor that needs every hour at which they can teach a class teaches it at all of them
+        forced |= mask & (mask.sum(axis=(1, 2)) == required_hours)[:, np.newaxis, np.newaxis, :]
+
+        problems = forced_problems(inp, forced)
+        if len(problems) > 0:
+            return mask, problems
+
+        free = mask & ~forced
+        reduced = mask.copy()
+        reduced[free & forced.any(axis=3)[:, :, :, np.newaxis]] = False # The professor teaches another class then
+        reduced[free & forced.any(axis=0)[np.newaxis]] = False # Another professor teaches the class then
+        reduced[free & (forced.sum(axis=(1, 2)) == required_hours)[:, np.newaxis, np.newaxis, :]] = False # All hours taught
+        reduced[free & (forced.sum(axis=2) == max_hours[:, np.newaxis, :])[:, :, np.newaxis, :]] = False # Daily limit reached
+        if (reduced == mask).all():
+            return mask, []
+        mask = reduced
+
+        problems = count_problems(inp, mask)
+        if len(problems) > 0:
+            return mask, problems
+
+
+def run(inp, complete=False):
+    """Returns (mask, problems): the variables that can be 1 (see usable) and the problems of the input
+
+    With complete=True the forced hours are followed too (see propagate), so more variables are fixed to 0.
+    Without it the problems only mean that some required hours will not be taught."""
+    mask = usable(inp)
+    problems = count_problems(inp, mask)
+    if complete and len(problems) == 0:
+        mask, problems = propagate(inp, mask)
+    return mask, problems
+
+
+def print_problems(problems):
+    if len(problems) == 0:
+        print("No problems found")
+    for p in problems:
+        print(f"[{p['constraint']}] {p['message']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Checks an input before it is solved")
+    parser.add_argument("input", nargs="?", default="input_data_non_complete", help="input module or input file")
+    parser.add_argument("--complete", action="store_true", help="check that every required hour can be taught")
+    args = parser.parse_args()
+
+    if os.path.exists(args.input):
+        inp = timetable_input.load(args.input)
+    else:
+        inp = timetable_input.from_module(importlib.import_module(args.input))
+    mask, problems = run(inp, args.complete)
+    print_problems(problems)
+    required_hours = np.asarray(inp.required_hours_per_professor_per_class)
+    before = ((required_hours[:, np.newaxis, np.newaxis, :] > 0) & np.asarray(inp.available)[:, :, :, np.newaxis]).sum()
+    print(f"{mask.sum()} of {before} variables can be used")
@@ -0,0 +1,186 @@
+"""Measures where the time and the memory go when building, solving and printing a timetable
+
+Every phase (create_timetable, each create_*_constraints, set_objective, loading the model to the solver,
+solve and the print/stats methods) is recorded with its wall and CPU time, the change of the memory used
+and the number of variables, constraints and nonzeros it added.
+
+    profiler = profiling.Profiler()                     # or Profiler(cprofile=True, tracemalloc=True)
+    timetable = Timetable(inp, profiler=profiler)       # or timetable.profiler = profiler at any time
+    timetable.solve()
+    profiler.print_summary()
+    profiler.dump_json("metrics.json")
+
+profiling.enable() profiles every Timetable created afterwards, and TIMETABLE_PROFILE=metrics.json python main.py
+does the same for main.py. When a timetable has no profiler, a phase only costs one attribute check.
+"""
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import time
+import tracemalloc as _tracemalloc
+
+
+default_profiler = None # Used by the timetables created without a profiler, see enable()
+
+
+def enable(**options):
+    """Profiles every Timetable created from now on with a new Profiler(**options), which is returned"""
+    global default_profiler
+    default_profiler = Profiler(**options)
+    return default_profiler
+
+
+def disable():
+    global default_profiler
+    default_profiler = None
+
+
+def rss_mb():
+    """The memory used by the process (resident set size) in MB, None if it cannot be read"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1])*os.sysconf("SC_PAGE_SIZE")/2**20
+    except (OSError, ValueError, AttributeError): # Not Linux
+        return None
+
+
+def model_size(timetable):
+    """The number of variables, constraints and nonzeros of the model built so far"""
+    keys = getattr(timetable, "keys", None)
+    return (0 if keys is None else len(keys), timetable.number_of_rows, sum(len(rows) for rows in timetable.matrix_rows))
+
+
+def phase(timetable, name):
+    """A context manager that records the phase name of timetable, if it has a profiler"""
+    if timetable.profiler is None:
+        return contextlib.nullcontext()
+    return timetable.profiler.phase(name, timetable)
+
+
+def profiled(method):
+    """Decorator for the methods of Timetable that are phases, named after the method"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.profiler is None:
+            return method(self, *args, **kwargs)
+        with self.profiler.phase(method.__name__, self):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class Profiler:
+    """Keeps one record (a dict) per phase, in the order the phases ended
+
+    cprofile: also runs cProfile in every phase (the outermost one if they are nested), see print_profile
+    tracemalloc: measures the memory allocated by Python in every phase with tracemalloc, including its peak,
+    instead of the resident memory of the process (slower, but exact)
+    hooks: functions called with every record when its phase ends, e.g. logging_hook()"""
+
+    def __init__(self, cprofile=False, tracemalloc=False, hooks=()):
+        self.cprofile = cprofile
+        self.tracemalloc = tracemalloc
+        self.hooks = list(hooks)
+        self.records = []
+        self.profiles = {} # phase -> pstats.Stats, with cprofile
+        self.depth = 0
+        self.peaks = [] # With tracemalloc, the peak memory of the phases running, outermost first
+
+    @contextlib.contextmanager
+    def phase(self, name, timetable):
+        if self.tracemalloc and not _tracemalloc.is_tracing():
+            _tracemalloc.start()
+        profile = cProfile.Profile() if self.cprofile and self.depth == 0 else None
+        size = model_size(timetable)
+        if self.tracemalloc:
+            memory, peak = _tracemalloc.get_traced_memory()
+            memory /= 2**20
+            if self.peaks: # Resetting the peak below would lose the peak of the outer phase so far
+                self.peaks[-1] = max(self.peaks[-1], peak)
+            self.peaks.append(0)
+            _tracemalloc.reset_peak()
+        else:
+            memory = rss_mb()
+        wall, cpu = time.perf_counter(), time.process_time()
+        self.depth += 1
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            self.depth -= 1
+            record = {"phase": name, "wall_time": time.perf_counter() - wall, "cpu_time": time.process_time() - cpu}
+            if self.tracemalloc:
+                current, peak = _tracemalloc.get_traced_memory()
+                peak = max(peak, self.peaks.pop())
+                if self.peaks:
+                    self.peaks[-1] = max(self.peaks[-1], peak)
+                record["memory_delta_mb"] = current/2**20 - memory
+                record["peak_memory_mb"] = peak/2**20
+            else:
+                after = rss_mb()
+                record["memory_delta_mb"] = None if memory is None or after is None else after - memory
+            for key, before, after in zip(["variables", "constraints", "nonzeros"], size, model_size(timetable)):
+                record[key] = after - before
+            self.records.append(record)
+            if profile is not None:
+                stats = pstats.Stats(profile)
+                if name in self.profiles:
+                    self.profiles[name].add(stats)
+                else:
+                    self.profiles[name] = stats
+            for hook in self.hooks:
+                hook(record)
+
+    def totals(self):
+        """The wall and CPU time of every phase name, added over the times it ran"""
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record["phase"], {"calls": 0, "wall_time": 0.0, "cpu_time": 0.0})
+            total["calls"] += 1
+            total["wall_time"] += record["wall_time"]
+            total["cpu_time"] += record["cpu_time"]
+        return totals
+
+    def print_summary(self):
+        print("Phase\t\t\t\t\tWall (s)\tCPU (s)\tMemory (MB)\tVariables\tConstraints\tNonzeros")
+        for record in self.records:
+            memory = "-" if record["memory_delta_mb"] is None else f"{record['memory_delta_mb']:+.1f}"
+            print(f"{record['phase']:<40}{record['wall_time']:.4f}\t\t{record['cpu_time']:.4f}\t{memory}\t\t"
+                  f"{record['variables']}\t\t{record['constraints']}\t\t{record['nonzeros']}")
+
+    def print_profile(self, name, top=20):
+        """Prints the functions that took the most time in the phase name (needs cprofile=True)"""
+        if name not in self.profiles:
+            print(f"No profile of {name}, only the outermost phases are profiled: {', '.join(self.profiles)}")
+            return
+        stream = io.StringIO()
+        self.profiles[name].stream = stream
+        self.profiles[name].sort_stats("cumulative").print_stats(top)
+        print(stream.getvalue())
+
+    def dump_json(self, path):
+        """Writes the records and the totals per phase to a json file"""
+        with open(path, "w") as f:
+            json.dump({"phases": self.records, "totals": self.totals()}, f, indent=1)
+
+    def dump_profiles(self, directory):
+        """Writes the cProfile statistics of every phase to directory/<phase>.prof (for snakeviz, pstats, ...)"""
+        os.makedirs(directory, exist_ok=True)
+        for name, stats in self.profiles.items():
+            stats.dump_stats(os.path.join(directory, f"{name}.prof"))
+
+
+def logging_hook(logger=None, level=logging.INFO):
+    """Returns a hook that logs every record as one json line, for log-based monitoring"""
+    logger = logger or logging.getLogger("timetable.profiling")
+
+    def hook(record):
+        logger.log(level, json.dumps(record))
+    return hook
@@ -0,0 +1,107 @@
+"""On-disk cache of solved timetables, keyed by a hash of everything that changes the solution
+
+Every entry is a json file named after the sha256 of the input (dimensions, required and max hours,
+unavailable hours, preferences), the weights of the objective and the solver options.
+The entries are written to a temporary file and renamed, so several processes can read and write
+the same cache at the same time: a reader sees either the whole entry or no entry.
+When the cache gets bigger than max_bytes the least recently used entries are removed.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+import solvers
+
+
+def input_key(inp, params, extra_priority, options):
+    """Returns the hash of the input inp (a timetable_input.TimetableInput), the weights of the objective and the solver options (a dict)
+
+    The preferences are sorted and merged first, so the same input always gives the same key."""
+    def as_set(values):
+        return sorted({int(value) for value in values})
+
+    data = {
+        "dimensions": [inp.number_of_professors, inp.number_of_days, inp.number_of_hours, inp.number_of_classes],
+        "required_hours": np.array(inp.required_hours_per_professor_per_class).tolist(),
+        "max_hours_per_day": np.array(inp.max_hours_per_professor_per_class_per_day).tolist(),
+        "unavailable_hours": np.flatnonzero(~np.asarray(inp.available)).tolist(),
+        "preferred_days": [as_set(days) for days in inp.preferred_days_per_professor],
+        "days_to_avoid": [as_set(days) for days in inp.days_to_avoid_per_professor],
+        "preferred_hours": [as_set(hours) for hours in inp.preferred_hours_per_professor],
+        "hours_to_avoid": [as_set(hours) for hours in inp.hours_to_avoid_per_professor],
+        "params": {name: float(weight) for name, weight in params.items()},
+        "extra_priority": [float(priority) for priority in extra_priority],
+        "options": options,
+    }
+    text = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class SolutionCache:
+    """A directory of solved timetables, at most max_bytes big"""
+
+    def __init__(self, directory=".timetable_cache", max_bytes=100*1024*1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        """Returns the (SolveResult, assignments array) stored for key, or None if there is none"""
+        try:
+            with open(self.path(key)) as f:
+                entry = json.load(f)
+            os.utime(self.path(key)) # Marks the entry as recently used
+        except (FileNotFoundError, ValueError): # Not in the cache, or removed by another process while reading it
+            return None
+        result = solvers.SolveResult(entry["status"], entry["objective"], entry["gap"], entry["time"])
+        return result, np.array(entry["assignments"], dtype=np.int64).reshape(-1, 4)
+
+    def put(self, key, result, assignments):
+        """Stores the result and the assignments (i, d, h, c) of a solve under key"""
+        entry = {"status": result.status, "objective": result.objective, "gap": result.gap, "time": result.time,
+                 "assignments": np.asarray(assignments).tolist()}
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(temporary, self.path(key)) # Atomic, readers never see half an entry
+        except BaseException:
+            os.remove(temporary)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError: # Removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, name in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,365 @@
+"""Solver backends for the Timetable model
+
+Every backend loads the same model built by Timetable (the binary columns self.keys with their upper bounds,
+the constraint matrix and the objective vector), solves it, and returns the values of the columns.
+This way Timetable does not depend on the solver that is used.
+"""
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pymprog
+from pymprog import glpk
+
+
+@dataclass
+class SolveResult:
+    """The outcome of solving the model
+
+    status is one of "optimal", "feasible" (a timetable was found but not proven optimal, e.g. because of a limit),
+    "infeasible" or "no solution" (a limit was reached before any timetable was found).
+    gap is the relative gap between the objective and the best bound when the solver stopped.
+    values holds the value of every variable (column) of the timetable, if there is one.
+    """
+    status: str
+    objective: float = None
+    gap: float = None
+    time: float = None
+    values: np.ndarray = None
+
+
+def empty_result(timetable):
+    """The result of a model without columns (nothing to teach): every row is 0, so it is optimal with objective 0
+    if 0 is within the bounds of every row"""
+    _, _, _, lower, upper = timetable.constraint_matrix()
+    if (lower <= 0).all() and (upper >= 0).all():
+        return SolveResult("optimal", 0.0, 0.0, 0.0, np.zeros(0))
+    return SolveResult("infeasible", time=0.0)
+
+
+class GLPKBackend:
+    """Solves the model with GLPK through pymprog (the default backend)"""
+
+    name = "glpk"
+
+    def load(self, timetable):
+        self.timetable = timetable
+        self.model = pymprog.model('Timetable')
+        # The columns are numbered like timetable.keys, without a pymprog variable or a name for each one (see write_model)
+        self.add_cols(timetable.upper)
+
+        rows, cols, vals, lower, upper = timetable.constraint_matrix()
+        if len(lower) > 0:
+            first = self.model.add_rows(len(lower))
+            for r, (lo, up) in enumerate(zip(lower.tolist(), upper.tolist())):
+                self.set_row_bnds(first + r, lo, up)
+
+            # The whole matrix is loaded with a single glp_load_matrix call, glpk arrays are 1-based
+            ia, ja, ar = glpk.intArray(len(rows) + 1), glpk.intArray(len(rows) + 1), glpk.doubleArray(len(rows) + 1)
+            for n, (r, c, v) in enumerate(zip((rows + first).tolist(), (cols + 1).tolist(), vals.tolist()), start=1):
+                ia[n], ja[n], ar[n] = r, c, v
+            self.model.load_matrix(len(rows), ia, ja, ar)
+
+        self.model.set_obj_dir(glpk.GLP_MAX)
+        for j, coefficient in enumerate(timetable.objective.tolist(), start=1):
+            if coefficient != 0:
+                self.model.set_obj_coef(j, coefficient)
+
+    def set_row_bnds(self, row, lower, upper):
+        """Sets the bounds of the glpk row (1-based), choosing the type of the bounds from the infinite ones"""
+        lower, upper = float(lower), float(upper)
+        if lower == -np.inf and upper == np.inf:
+            self.model.set_row_bnds(row, glpk.GLP_FR, 0, 0)
+        elif lower == -np.inf:
+            self.model.set_row_bnds(row, glpk.GLP_UP, 0, upper)
+        elif upper == np.inf:
+            self.model.set_row_bnds(row, glpk.GLP_LO, lower, 0)
+        else:
+            self.model.set_row_bnds(row, glpk.GLP_FX if lower == upper else glpk.GLP_DB, lower, upper)
+
+    def add_row(self, row, cols, vals, lower, upper):
+        """Adds the row lower <= sum(vals*K[cols]) <= upper to the model, as row number row of the timetable"""
+        assert self.model.add_rows(1) == row + 1
+        self.change_row(row, cols, vals, lower, upper)
+
+    def change_row(self, row, cols, vals, lower, upper):
+        """Replaces the coefficients and the bounds of a row"""
+        ind, val = glpk.intArray(len(cols) + 1), glpk.doubleArray(len(cols) + 1)
+        for n, (c, v) in enumerate(zip((np.asarray(cols) + 1).tolist(), np.asarray(vals, dtype=float).tolist()), start=1):
+            ind[n], val[n] = c, v
+        self.model.set_mat_row(row + 1, len(cols), ind, val)
+        self.set_row_bnds(row + 1, lower, upper)
+
+    def set_row_bounds(self, rows, lower, upper):
+        """Changes the bounds of rows"""
+        for row, lo, up in zip(np.asarray(rows).tolist(), np.asarray(lower).tolist(), np.asarray(upper).tolist()):
+            self.set_row_bnds(row + 1, lo, up)
+
+    def add_cols(self, upper):
+        """Adds one integer column per upper bound (lower bound 0) at the end of the model"""
+        if len(upper) == 0: # glp_add_cols aborts the process for 0 columns
+            return
+        first = self.model.add_cols(len(upper)) - 1
+        for j in range(first, first + len(upper)):
+            self.model.set_col_kind(j + 1, glpk.GLP_IV)
+        self.set_col_upper(np.arange(first, first + len(upper)), upper)
+
+    def set_col_upper(self, cols, upper):
+        """Changes the upper bounds of columns"""
+        for j, up in zip(np.asarray(cols).tolist(), np.asarray(upper).tolist()):
+            self.model.set_col_bnds(j + 1, glpk.GLP_FX if up == 0 else glpk.GLP_DB, 0, up)
+
+    def set_objective(self, cols, coefficients):
+        """Changes the objective coefficients of columns"""
+        for j, coefficient in zip(np.asarray(cols).tolist(), np.asarray(coefficients, dtype=float).tolist()):
+            self.model.set_obj_coef(j + 1, coefficient)
+
+    def add_columns(self, keys, upper, objective, rows, cols, vals):
+        """Adds columns for the variables keys (i, d, h, c), with their coefficients (rows, cols, vals) in existing rows"""
+        first = self.model.get_num_cols()
+        self.add_cols(upper)
+        for n in range(len(keys)):
+            in_col = cols == first + n
+            ind, val = glpk.intArray(int(in_col.sum()) + 1), glpk.doubleArray(int(in_col.sum()) + 1)
+            for m, (r, v) in enumerate(zip((rows[in_col] + 1).tolist(), vals[in_col].tolist()), start=1):
+                ind[m], val[m] = r, v
+            self.model.set_mat_col(first + n + 1, int(in_col.sum()), ind, val)
+        self.set_objective(np.arange(first, first + len(keys)), objective)
+
+    def set_start(self, values):
+        """Loads values (one per column) as the current MIP solution of glpk, used as the initial incumbent
+
+        glpk only reads MIP solutions from files (glp_read_mip), which need the value of every row too."""
+        rows, cols, vals, _, _ = self.timetable.constraint_matrix()
+        activity = np.bincount(rows, weights=vals*values[cols], minlength=self.model.get_num_rows())
+        # The objective of the model, which may differ from timetable.objective (e.g. in Timetable.solve_lexicographic)
+        objective = sum(self.model.get_obj_coef(j + 1)*values[j] for j in np.flatnonzero(values).tolist())
+        lines = [f"s mip {self.model.get_num_rows()} {len(values)} f {float(objective)}"]
+        lines += [f"i {r} {v:g}" for r, v in enumerate(activity.tolist(), start=1)]
+        lines += [f"j {j} {v:g}" for j, v in enumerate(values.tolist(), start=1)]
+        lines.append("e o f")
+
+        fd, path = tempfile.mkstemp(suffix=".mip")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write("\n".join(lines) + "\n")
+            return self.model.read_mip(path) == 0
+        finally:
+            os.remove(path)
+
+    def solve(self, time_limit=None, mip_gap=None, node_limit=None, callback=None, start=None):
+        """Solves the LP relaxation with the simplex method and then the MIP with glp_intopt
+
+        GLPK has no node limit and pymprog cannot pass a Python callback to glp_intopt,
+        so node_limit is ignored and the callback is only called once, with the final timetable.
+        start (one value per column) is used as the initial incumbent of glp_intopt (use_sol)."""
+        if self.model.get_num_cols() == 0:
+            return empty_result(self.timetable)
+        started = time.perf_counter()
+        if node_limit is not None:
+            print("GLPK does not support a node limit, node_limit is ignored")
+
+        # Passing None removes an option set by a previous solve
+        self.model.solver(float, tm_lim=None if time_limit is None else max(1, int(time_limit*1000)))
+        if self.model.solve(float)[0] in (glpk.GLP_EBADB, glpk.GLP_ESING, glpk.GLP_ECOND):
+            # The basis of the previous solve is not valid after changing the model, start from the standard one
+            self.model.std_basis()
+            self.model.solve(float)
+        if self.model.get_status() == glpk.GLP_NOFEAS:
+            return SolveResult("infeasible", time=time.perf_counter() - started)
+        if self.model.get_status() != glpk.GLP_OPT: # The time limit was reached before the LP relaxation was solved
+            return SolveResult("no solution", time=time.perf_counter() - started)
+        bound = self.model.get_obj_val()
+
+        remaining = None if time_limit is None else max(1, int((time_limit - (time.perf_counter() - started))*1000))
+        use_sol = 1 if start is not None and self.set_start(start) else None
+        # The clique cuts of glpk are part of the formulation of Timetable(strong=True), the plain model keeps the defaults
+        clq_cuts = glpk.GLP_ON if getattr(self.timetable, "strong", False) else None
+        self.model.solver(int, tm_lim=remaining, mip_gap=None if mip_gap is None else float(mip_gap), use_sol=use_sol, clq_cuts=clq_cuts)
+        self.model.solve(int)
+        elapsed = time.perf_counter() - started
+
+        status = self.model.mip_status()
+        if status == glpk.GLP_NOFEAS:
+            return SolveResult("infeasible", time=elapsed)
+        if status not in (glpk.GLP_OPT, glpk.GLP_FEAS):
+            return SolveResult("no solution", time=elapsed)
+
+        objective = self.model.mip_obj_val()
+        # Same definition of the gap as glpk, with the LP relaxation as the bound
+        gap = 0.0 if status == glpk.GLP_OPT else abs(bound - objective)/(abs(objective) + np.finfo(float).eps)
+        result = SolveResult("optimal" if status == glpk.GLP_OPT else "feasible", objective, gap, elapsed, self.values())
+        if callback is not None:
+            callback(result)
+        return result
+
+    def values(self):
+        """The value of every column in the last MIP solution, as one float array"""
+        values = np.empty(self.model.get_num_cols())
+        for j in range(len(values)):
+            values[j] = self.model.mip_col_val(j + 1)
+        return values
+
+    def objective_value(self):
+        return self.model.vobj()
+
+    def write_model(self, path):
+        """Writes the model in CPLEX LP format, with the columns named K_i_j_k_l (only named here, for debugging)"""
+        for j in range(self.model.get_num_cols()):
+            self.model.set_col_name(j + 1, self.timetable.variable_name(j))
+        self.model.write_lp(None, path)
+
+
+class HiGHSBackend:
+    """Solves the model with the HiGHS MIP solver (needs the highspy package)"""
+
+    name = "highs"
+
+    def load(self, timetable):
+        import highspy
+
+        self.timetable = timetable
+        self.highs = highspy.Highs()
+        rows, cols, vals, lower, upper = timetable.constraint_matrix()
+        number_of_columns = len(timetable.keys)
+
+        lp = highspy.HighsLp()
+        lp.num_col_ = number_of_columns
+        lp.num_row_ = len(lower)
+        lp.sense_ = highspy.ObjSense.kMaximize
+        lp.col_cost_ = timetable.objective
+        lp.col_lower_ = np.zeros(number_of_columns)
+        lp.col_upper_ = timetable.upper.astype(float)
+        lp.row_lower_ = np.maximum(lower, -highspy.kHighsInf)
+        lp.row_upper_ = np.minimum(upper, highspy.kHighsInf)
+        lp.integrality_ = [highspy.HighsVarType.kInteger]*number_of_columns
+
+        # HiGHS takes the matrix column by column
+        order = np.lexsort((rows, cols))
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.start_ = np.concatenate([[0], np.cumsum(np.bincount(cols, minlength=number_of_columns))])
+        lp.a_matrix_.index_ = rows[order]
+        lp.a_matrix_.value_ = vals[order]
+        self.highs.passModel(lp)
+
+    def add_row(self, row, cols, vals, lower, upper):
+        """Adds the row lower <= sum(vals*K[cols]) <= upper to the model, as row number row of the timetable"""
+        assert self.highs.getNumRow() == row
+        self.highs.addRow(max(float(lower), -self.highs.inf), min(float(upper), self.highs.inf), len(cols),
+                          np.asarray(cols, dtype=np.int32), np.asarray(vals, dtype=float))
+
+    def change_row(self, row, cols, vals, lower, upper):
+        """Replaces the coefficients and the bounds of a row"""
+        _, old_cols, old_vals = self.highs.getRowEntries(row)
+        old = dict(zip(np.asarray(old_cols).tolist(), np.asarray(old_vals, dtype=float).tolist()))
+        new = dict(zip(np.asarray(cols).tolist(), np.asarray(vals, dtype=float).tolist()))
+        for col in old.keys() | new.keys():
+            if old.get(col, 0.0) != new.get(col, 0.0):
+                self.highs.changeCoeff(row, col, new.get(col, 0.0))
+        self.highs.changeRowBounds(row, max(float(lower), -self.highs.inf), min(float(upper), self.highs.inf))
+
+    def set_row_bounds(self, rows, lower, upper):
+        """Changes the bounds of rows"""
+        self.highs.changeRowsBounds(len(rows), np.asarray(rows, dtype=np.int32),
+                                    np.maximum(lower, -self.highs.inf), np.minimum(upper, self.highs.inf))
+
+    def set_col_upper(self, cols, upper):
+        """Changes the upper bounds of columns"""
+        self.highs.changeColsBounds(len(cols), np.asarray(cols, dtype=np.int32), np.zeros(len(cols)), np.asarray(upper, dtype=float))
+
+    def set_objective(self, cols, coefficients):
+        """Changes the objective coefficients of columns"""
+        self.highs.changeColsCost(len(cols), np.asarray(cols, dtype=np.int32), np.asarray(coefficients, dtype=float))
+
+    def add_columns(self, keys, upper, objective, rows, cols, vals):
+        """Adds columns for the variables keys (i, d, h, c), with their coefficients (rows, cols, vals) in existing rows"""
+        import highspy
+
+        first = self.highs.getNumCol()
+        order = np.argsort(cols, kind="stable")
+        starts = np.searchsorted(cols[order], np.arange(first, first + len(keys)))
+        self.highs.addCols(len(keys), np.asarray(objective, dtype=float), np.zeros(len(keys)), np.asarray(upper, dtype=float),
+                           len(rows), starts.astype(np.int32), rows[order].astype(np.int32), vals[order].astype(float))
+        self.highs.changeColsIntegrality(len(keys), np.arange(first, first + len(keys), dtype=np.int32),
+                                         np.array([highspy.HighsVarType.kInteger]*len(keys)))
+
+    def set_start(self, values):
+        """Gives values (one per column) to HiGHS as the starting solution of the MIP"""
+        import highspy
+
+        solution = highspy.HighsSolution()
+        solution.col_value = values.astype(float)
+        solution.value_valid = True
+        self.highs.setSolution(solution)
+
+    def solve(self, time_limit=None, mip_gap=None, node_limit=None, callback=None, start=None):
+        import highspy
+
+        if self.highs.getNumCol() == 0:
+            return empty_result(self.timetable)
+        if start is not None:
+            self.set_start(start)
+
+        # Options that are not given are set back to the defaults of HiGHS
+        self.highs.setOptionValue("time_limit", highspy.kHighsInf if time_limit is None else float(time_limit))
+        self.highs.setOptionValue("mip_rel_gap", 1e-4 if mip_gap is None else float(mip_gap))
+        self.highs.setOptionValue("mip_max_nodes", highspy.kHighsIInf if node_limit is None else int(node_limit))
+
+        # HiGHS does not stop when interrupted from the improving solution callback, only from the interrupt callback,
+        # which it calls a little later (it may still find a better timetable in between, it is kept)
+        stop = [False]
+
+        def improving_solution(event):
+            if stop[0]:
+                return
+            incumbent = SolveResult("feasible", event.data_out.objective_function_value, event.data_out.mip_gap,
+                                    event.data_out.running_time, np.array(event.data_out.mip_solution))
+            if callback(incumbent):
+                stop[0] = True
+
+        def interrupt(event):
+            if stop[0]:
+                event.interrupt()
+
+        self.highs.cbMipImprovingSolution.clear()
+        self.highs.cbMipInterrupt.clear()
+        if callback is not None:
+            self.highs.cbMipImprovingSolution.subscribe(improving_solution)
+            self.highs.cbMipInterrupt.subscribe(interrupt)
+
+        started = time.perf_counter()
+        self.highs.run()
+        elapsed = time.perf_counter() - started
+
+        status = self.highs.getModelStatus()
+        info = self.highs.getInfo()
+        if status == highspy.HighsModelStatus.kInfeasible:
+            return SolveResult("infeasible", time=elapsed)
+        if info.primal_solution_status != highspy.SolutionStatus.kSolutionStatusFeasible:
+            return SolveResult("no solution", time=elapsed)
+        return SolveResult("optimal" if status == highspy.HighsModelStatus.kOptimal else "feasible",
+                           info.objective_function_value, info.mip_gap, elapsed, self.values())
+
+    def values(self):
+        return np.array(self.highs.getSolution().col_value)
+
+    def objective_value(self):
+        return self.highs.getInfo().objective_function_value
+
+    def write_model(self, path):
+        """Writes the model in the format of the extension of path (.lp or .mps), with the columns named K_i_j_k_l"""
+        for j in range(self.highs.getNumCol()):
+            self.highs.passColName(j, self.timetable.variable_name(j))
+        self.highs.writeModel(path)
+
+
+backends = {backend.name: backend for backend in (GLPKBackend, HiGHSBackend)}
+
+
+def get_backend(name):
+    """Returns a new backend by name ("glpk" or "highs")"""
+    if name not in backends:
+        raise ValueError(f"Unknown solver backend {name!r}, choose one of: {', '.join(backends)}")
+    return backends[name]()
@@ -0,0 +1,101 @@
+"""Finds the classes and the professors that can be exchanged, and keeps only one of the exchanged timetables
+
+Two classes are identical if every professor has the same required hours and the same daily limit for both:
+exchanging their whole timetables gives another timetable with the same objective. Two professors are identical
+if they have the same hours, limits, availability, preferences and extra priority. The solver would explore
+all these exchanged timetables, so Timetable(symmetry=True) adds constraints that only allow one of them.
+
+For identical classes a < b and a professor p of both (the pivot), the first hour at which p teaches a
+has to come before the first hour at which p teaches b:
+    K[p, s, b] <= sum(K[p, t, a] for t < s)     for every slot s (day*hours + hour)
+Any timetable can be turned into one that satisfies this by exchanging the classes, so no objective value is lost.
+Identical professors a < b get the same constraints with a class of both as pivot. The pivot of the classes is a
+professor that has no identical professor and the pivot of the professors a class that has no identical class,
+so exchanging classes does not break the order of the professors and the other way around.
+"""
+import numpy as np
+
+
+def identical_classes(inp):
+    """Returns the groups of identical classes, as lists of at least 2 class indices"""
+    required_hours = np.asarray(inp.required_hours_per_professor_per_class)
+    max_hours = np.asarray(inp.max_hours_per_professor_per_class_per_day)
+    groups = {}
+    for c in range(inp.number_of_classes):
+        groups.setdefault((required_hours[:, c].tobytes(), max_hours[:, c].tobytes()), []).append(c)
+    return [group for group in groups.values() if len(group) > 1 and required_hours[:, group[0]].any()]
+
+
+def identical_professors(inp, extra_priority):
+    """Returns the groups of identical professors, as lists of at least 2 professor indices"""
+    required_hours = np.asarray(inp.required_hours_per_professor_per_class)
+    max_hours = np.asarray(inp.max_hours_per_professor_per_class_per_day)
+    available = np.asarray(inp.available)
+    groups = {}
+    for i in range(inp.number_of_professors):
+        preferences = tuple(tuple(sorted(set(values[i]))) for values in [inp.preferred_days_per_professor, inp.days_to_avoid_per_professor,
+                                                                          inp.preferred_hours_per_professor, inp.hours_to_avoid_per_professor])
+        key = (required_hours[i].tobytes(), max_hours[i].tobytes(), available[i].tobytes(), preferences, extra_priority[i])
+        groups.setdefault(key, []).append(i)
+    return [group for group in groups.values() if len(group) > 1 and required_hours[group[0]].any()]
+
+
+def groups(inp, extra_priority):
+    """Returns (class_groups, professor_groups): lists of (members, pivot), without the groups that have no possible pivot"""
+    required_hours = np.asarray(inp.required_hours_per_professor_per_class)
+    classes, professors = identical_classes(inp), identical_professors(inp, extra_priority)
+    grouped_classes = {c for group in classes for c in group}
+    grouped_professors = {i for group in professors for i in group}
+
+    class_groups = []
+    for group in classes:
+        hours = [(required_hours[i, group[0]], -i) for i in range(inp.number_of_professors) if i not in grouped_professors]
+        best = max(hours, default=(0, 0))
+        if best[0] > 0: # The professor with the most hours, so the constraints cut the most
+            class_groups.append((group, -best[1]))
+    professor_groups = []
+    for group in professors:
+        hours = [(required_hours[group[0], c], -c) for c in range(inp.number_of_classes) if c not in grouped_classes]
+        best = max(hours, default=(0, 0))
+        if best[0] > 0:
+            professor_groups.append((group, -best[1]))
+    return class_groups, professor_groups
+
+
+def breaking_rows(timetable, class_groups, professor_groups):
+    """Returns the constraints as a list of (cols, vals), every one is sum(vals*K[cols]) <= 0"""
+    slots = [(d, h) for d in range(timetable.number_of_days) for h in range(timetable.number_of_hours)]
+    rows = []
+    for members, pivot, key in [(members, pivot, lambda m, d, h, p: (p, d, h, m)) for members, pivot in class_groups] + \
+                               [(members, pivot, lambda m, d, h, p: (m, d, h, p)) for members, pivot in professor_groups]:
+        for a, b in zip(members, members[1:]):
+            earlier = [] # The columns of a at the slots before s
+            for d, h in slots:
+                later = timetable.column(key(b, d, h, pivot))
+                if later is not None:
+                    rows.append(([later] + earlier, [1.0] + [-1.0]*len(earlier)))
+                column = timetable.column(key(a, d, h, pivot))
+                if column is not None:
+                    earlier.append(column)
+    return rows
+
+
+def canonical(assignments, number_of_hours, class_groups, professor_groups):
+    """Exchanges the identical classes and professors of a timetable (assignments (i, d, h, c)) so that it satisfies the constraints"""
+    assignments = np.array(assignments, dtype=np.int64).reshape(-1, 4).copy()
+    slot = assignments[:, 1]*number_of_hours + assignments[:, 2]
+    for column, pivot_column, group_list in [(3, 0, class_groups), (0, 3, professor_groups)]:
+        for members, pivot in group_list:
+            first = []
+            for m in members:
+                taught = slot[(assignments[:, column] == m) & (assignments[:, pivot_column] == pivot)]
+                first.append(taught.min() if len(taught) > 0 else np.inf)
+            order = [members[n] for n in np.argsort(first, kind="stable")]
+            if order == members:
+                continue
+            renamed = {old: new for old, new in zip(order, members)}
+            values = assignments[:, column].copy()
+            for old, new in renamed.items():
+                values[assignments[:, column] == old] = new
+            assignments[:, column] = values
+    return assignments
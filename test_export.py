@@ -0,0 +1,45 @@
+"""Tests of export.py, run with: python -m pytest test_export.py"""
+import glob
+import os
+
+import numpy as np
+
+import export
+import input_data_real
+import main
+import timetable_input
+
+
+def count_events(directory, kind):
+    events = 0
+    for path in glob.glob(os.path.join(directory, f"{kind}_*.ics")):
+        with open(path) as f:
+            events += f.read().count("BEGIN:VEVENT")
+    return events
+
+
+def test_icalendar_after_editing_the_model(tmp_path):
+    # Making the unavailable hours available adds columns at the end of the model, so the solution is not in key order
+    timetable = main.Timetable(input_data_real)
+    for i, d, h in np.argwhere(~np.asarray(timetable.available)).tolist():
+        timetable.set_unavailable(i, d, h, False)
+    timetable.solve()
+
+    export.write_icalendar(timetable, str(tmp_path))
+    assert count_events(str(tmp_path), "professor") == len(timetable.solution)
+    assert count_events(str(tmp_path), "class") == len(timetable.solution)
+
+
+def test_icalendar_file_names_stay_in_the_directory(tmp_path):
+    inp = timetable_input.from_module(input_data_real)
+    inp.class_names = ["../A", "B/1", "B:1"] # The last 2 give the same file name
+    inp.professor_names = [f"Prof/{i}" for i in range(inp.number_of_professors)]
+    timetable = main.Timetable(inp)
+    timetable.solve()
+
+    directory = tmp_path / "calendars"
+    export.write_icalendar(timetable, str(directory))
+    assert sorted(os.listdir(tmp_path)) == ["calendars"]
+    assert len(os.listdir(directory)) == inp.number_of_professors + inp.number_of_classes
+    assert os.path.exists(directory / "professor_Prof_0.ics")
+    assert count_events(str(directory), "professor") == count_events(str(directory), "class") == len(timetable.solution)
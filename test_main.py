@@ -0,0 +1,65 @@
+"""Tests of main.Timetable, lns.py and twostage.py, run with: python -m pytest"""
+import copy
+
+import numpy as np
+import pytest
+
+import input_data_real
+import lns
+import main
+import timetable_input
+import twostage
+
+
+def test_edited_model_solves_like_a_new_one():
+    inp = timetable_input.from_module(input_data_real)
+    timetable = main.Timetable(inp)
+    timetable.solve()
+
+    timetable.set_unavailable(0, 0, 0)
+    timetable.set_unavailable(3, 2, 1)
+    i, c = np.argwhere(inp.required_hours_per_professor_per_class == 0)[0].tolist()
+    timetable.set_required_hours(i, c, 2)
+    timetable.set_required_hours(1, 0, max(0, inp.required_hours_per_professor_per_class[1, 0] - 1))
+    timetable.set_max_hours_per_day(2, 1, 1)
+    timetable.set_weight("preferred_days", 3)
+    timetable.set_priority(4, 3)
+    edited = timetable.solve()
+
+    rebuilt = main.Timetable(copy.deepcopy(timetable.inp), params=dict(timetable.params), extra_priority=list(timetable.extra_priority)).solve()
+    assert edited.status == rebuilt.status == "optimal"
+    assert edited.objective == pytest.approx(rebuilt.objective)
+    assert timetable.verify(details=False)["feasible"]
+
+
+def small_input(required_hours):
+    """2 professors, 2 classes, 3 days of 2 hours, at most 1 hour per day for every pair"""
+    return timetable_input.TimetableInput(["A", "B"], ["M", "T", "W"], 2, required_hours, [[1, 1], [1, 1]], np.ones((2, 3, 2), dtype=bool),
+                                          [[], []], [[], []], [[], []], [[], []])
+
+
+@pytest.mark.parametrize("backend", ["glpk", "highs"])
+def test_input_without_hours(backend):
+    if backend == "highs":
+        pytest.importorskip("highspy")
+    timetable = main.Timetable(small_input([[0, 0], [0, 0]]), backend=backend)
+    result = timetable.solve()
+    assert result.status == "optimal"
+    assert result.objective == 0
+    assert len(timetable.solution) == 0
+
+
+def test_lns_and_twostage_with_days_without_hours():
+    # 6 hours fit in 3 days, so some of the days of the neighborhoods and of stage two have no lesson
+    for solve in (lambda timetable: lns.solve(timetable, time_limit=5, kinds=["day"], workers=1),
+                  lambda timetable: twostage.solve(timetable, workers=1)):
+        timetable = main.Timetable(small_input([[2, 1], [1, 2]]), build=False)
+        result = solve(timetable)
+        assert result.status in ("optimal", "feasible")
+        assert len(timetable.solution) == 6
+        assert timetable.verify(details=False)["feasible"]
+
+    for solve in (lambda timetable: lns.solve(timetable, time_limit=5, workers=1), lambda timetable: twostage.solve(timetable, workers=1)):
+        timetable = main.Timetable(small_input([[0, 0], [0, 0]]), build=False)
+        solve(timetable)
+        assert len(timetable.solution) == 0
@@ -0,0 +1,25 @@
+"""Tests of presolve.py, run with: python -m pytest"""
+import input_data_non_complete
+import main
+import presolve
+import timetable_input
+
+
+def test_input_that_cannot_be_complete_is_reported():
+    inp = timetable_input.from_module(input_data_non_complete)
+    _, problems = presolve.run(inp, complete=True)
+    assert len(problems) > 0
+    assert all(p["constraint"] and p["message"] for p in problems)
+
+    timetable = main.Timetable(inp, complete=True)
+    result = timetable.solve()
+    assert result.status == "infeasible"
+    assert timetable.problems == problems
+    assert timetable.solution is None
+
+
+def test_problems_are_only_hours_not_taught_without_complete():
+    inp = timetable_input.from_module(input_data_non_complete)
+    timetable = main.Timetable(inp)
+    assert timetable.solve().status == "optimal"
+    assert timetable.verify(details=False)["feasible"]
@@ -0,0 +1,21 @@
+"""Tests of the solver backends, run with: python -m pytest"""
+import pytest
+
+import input_data_synthetic
+import main
+
+
+def test_highs_stops_when_the_callback_returns_true():
+    pytest.importorskip("highspy")
+    timetable = main.Timetable(input_data_synthetic.generate(40, 8), backend="highs")
+    incumbents = []
+
+    def callback(result):
+        incumbents.append(result.objective)
+        return len(incumbents) == 2
+
+    result = timetable.solve(callback=callback)
+    assert len(incumbents) == 2
+    assert result.status == "feasible"
+    assert result.objective < 24475.5 # The optimum, found by the solve that is not stopped
+    assert timetable.verify(details=False)["feasible"]
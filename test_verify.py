@@ -0,0 +1,42 @@
+"""Tests of verify.py, run with: python -m pytest"""
+import numpy as np
+import pytest
+
+import timetable_input
+import verify
+
+
+def small_input():
+    """2 professors, 2 classes, 2 days of 2 hours, professor 1 is unavailable at the last hour of the week"""
+    available = np.ones((2, 2, 2), dtype=bool)
+    available[1, 1, 1] = False
+    return timetable_input.TimetableInput(["A", "B"], ["M", "T"], 2, [[2, 1], [1, 2]], [[1, 1], [1, 1]], available,
+                                          [[], []], [[], []], [[], []], [[], []])
+
+
+# A complete timetable of small_input that breaks no rule
+valid = [(0, 0, 0, 0), (0, 1, 0, 0), (0, 0, 1, 1), (1, 0, 0, 1), (1, 1, 0, 1), (1, 0, 1, 0)]
+
+
+def test_valid_timetable():
+    report = verify.check(small_input(), valid, complete=True)
+    assert report["feasible"]
+    assert sum(report["violations"].values()) == 0
+    assert report["problems"] == []
+
+
+@pytest.mark.parametrize("constraint, assignments, complete", [
+    ("range", valid + [(2, 0, 0, 0)], False),
+    ("professor_slot", valid + [(0, 0, 0, 1)], False), # Professor 0 teaches A and B at M hour 0
+    ("class_slot", valid + [(1, 1, 0, 0)], False), # Class A has professors 0 and 1 at T hour 0
+    ("coverage", valid + [(0, 1, 1, 1)], False), # Professor 0 teaches B 2 hours instead of 1
+    ("coverage", valid[1:], True), # Professor 0 teaches A 1 hour instead of 2
+    ("max_hours_per_day", [(0, 0, 0, 0), (0, 0, 1, 0)], False), # Professor 0 teaches A twice on M
+    ("unavailable", valid[:-1] + [(1, 1, 1, 0)], False),
+])
+def test_every_violation_is_found(constraint, assignments, complete):
+    report = verify.check(small_input(), assignments, complete=complete)
+    assert not report["feasible"]
+    assert report["violations"][constraint] >= 1
+    assert constraint in [p["constraint"] for p in report["problems"]]
+    assert report["violations"] == verify.check(small_input(), assignments, complete=complete, details=False)["violations"]
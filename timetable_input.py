@@ -0,0 +1,350 @@
+"""The input of a timetable: professors, classes, required hours, limits, availability and preferences
+
+An input can be:
+    - one of the input_data*.py modules (or any object with the same attributes), see from_module
+    - a json or yaml file, see from_document for the format
+    - a directory of csv files, see read_csv
+    - a .npz file compiled from any of the above, see TimetableInput.save
+
+load() reads json, yaml and csv inputs once, validates them and compiles them to a .npz file next to them,
+later runs read the .npz file directly, with its arrays memory-mapped.
+
+    python timetable_input.py school.yaml                 Compiles school.yaml to school.yaml.npz
+    python timetable_input.py input_data_real data.npz    Compiles the input_data_real module to data.npz
+"""
+import csv
+import json
+import os
+import struct
+import sys
+import zipfile
+
+import numpy as np
+
+
+# The lists of days or hours of every professor
+preference_fields = ["preferred_days_per_professor", "days_to_avoid_per_professor",
+                     "preferred_hours_per_professor", "hours_to_avoid_per_professor"]
+
+
+def preference_masks(inp):
+    """Returns the (professors x days) and (professors x hours) bool arrays of the preferences of inp, by objective term
+    ("preferred_days", "avoidance_days", "preferred_hours", "avoidance_hours"), True at the listed days or hours"""
+    masks = {}
+    for name, field, n in [("preferred_days", "preferred_days_per_professor", inp.number_of_days),
+                           ("avoidance_days", "days_to_avoid_per_professor", inp.number_of_days),
+                           ("preferred_hours", "preferred_hours_per_professor", inp.number_of_hours),
+                           ("avoidance_hours", "hours_to_avoid_per_professor", inp.number_of_hours)]:
+        values = getattr(inp, field)
+        mask = np.zeros((inp.number_of_professors, n), dtype=bool)
+        rows = np.repeat(np.arange(inp.number_of_professors), [len(v) for v in values])
+        mask[rows, np.fromiter((x for v in values for x in v), dtype=np.int64, count=len(rows))] = True
+        masks[name] = mask
+    return masks
+
+
+class TimetableInput:
+    """The input of a timetable as arrays, with the same attribute names as the input_data*.py modules
+
+    required_hours_per_professor_per_class and max_hours_per_professor_per_class_per_day are (professors x classes)
+    arrays, available is a (professors x days x hours) boolean array that is False where the professor is unavailable,
+    and the preferences are lists with the days (or hours) of every professor."""
+
+    def __init__(self, class_names, days_initials, number_of_hours, required_hours, max_hours_per_day, available,
+                 preferred_days, days_to_avoid, preferred_hours, hours_to_avoid, professor_names=None):
+        self.required_hours_per_professor_per_class = np.asarray(required_hours)
+        self.max_hours_per_professor_per_class_per_day = np.asarray(max_hours_per_day)
+        self.available = np.asarray(available, dtype=bool)
+        self.number_of_professors, self.number_of_classes = self.required_hours_per_professor_per_class.shape
+        self.number_of_days = len(days_initials)
+        self.number_of_hours = int(number_of_hours)
+        self.class_names = [str(name) for name in class_names]
+        self.days_initials = [str(name) for name in days_initials]
+        self.professor_names = [str(i) for i in range(self.number_of_professors)] if professor_names is None else [str(name) for name in professor_names]
+        self.preferred_days_per_professor = [[int(d) for d in days] for days in preferred_days]
+        self.days_to_avoid_per_professor = [[int(d) for d in days] for days in days_to_avoid]
+        self.preferred_hours_per_professor = [[int(h) for h in hours] for hours in preferred_hours]
+        self.hours_to_avoid_per_professor = [[int(h) for h in hours] for hours in hours_to_avoid]
+
+        P, C, D, H = self.number_of_professors, self.number_of_classes, self.number_of_days, self.number_of_hours
+        if len(self.class_names) != C or self.max_hours_per_professor_per_class_per_day.shape != (P, C) or self.available.shape != (P, D, H):
+            raise ValueError(f"The arrays of the input do not have the sizes of {P} professors, {C} classes, {D} days and {H} hours")
+        for name in preference_fields:
+            if len(getattr(self, name)) != P:
+                raise ValueError(f"{name} needs one list per professor")
+
+    @property
+    def unavailable_hours_per_professor(self):
+        """The (day, hour) pairs where every professor is unavailable, as in the input_data*.py modules"""
+        return [[(d, h) for d, h in np.argwhere(~available).tolist()] for available in self.available]
+
+    def writable(self, name):
+        """Returns the array name, copied first if it is read-only (memory-mapped from a .npz file)"""
+        array = getattr(self, name)
+        if not array.flags.writeable:
+            array = np.array(array)
+            setattr(self, name, array)
+        return array
+
+    def save(self, path):
+        """Compiles the input to a .npz file, stored without compression so that load_npz can memory-map it"""
+        arrays = {
+            "required_hours": self.required_hours_per_professor_per_class,
+            "max_hours_per_day": self.max_hours_per_professor_per_class_per_day,
+            "available": self.available,
+            "number_of_hours": np.array(self.number_of_hours),
+            "class_names": np.array(self.class_names, dtype=str),
+            "days_initials": np.array(self.days_initials, dtype=str),
+            "professor_names": np.array(self.professor_names, dtype=str),
+        }
+        # The lists of every professor are stored one after the other, with the offset where each one starts
+        for name in preference_fields:
+            lists = getattr(self, name)
+            arrays[name] = np.array([value for values in lists for value in values], dtype=np.int64)
+            arrays[name + "_offsets"] = np.cumsum([0] + [len(values) for values in lists], dtype=np.int64)
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+
+def from_module(module):
+    """Makes a TimetableInput from an input_data*.py module, or any object with the same attributes"""
+    if isinstance(module, TimetableInput):
+        return module
+    available = np.ones((module.number_of_professors, module.number_of_days, module.number_of_hours), dtype=bool)
+    for i, unavailable_hours in enumerate(module.unavailable_hours_per_professor):
+        if len(unavailable_hours) > 0:
+            days, hours = np.array(unavailable_hours).T
+            available[i, days, hours] = False
+    return TimetableInput(module.class_names, module.days_initials, module.number_of_hours,
+                          np.array(module.required_hours_per_professor_per_class, dtype=np.int64).reshape(module.number_of_professors, module.number_of_classes),
+                          np.array(module.max_hours_per_professor_per_class_per_day, dtype=np.int64).reshape(module.number_of_professors, module.number_of_classes),
+                          available, module.preferred_days_per_professor, module.days_to_avoid_per_professor,
+                          module.preferred_hours_per_professor, module.hours_to_avoid_per_professor)
+
+
+def from_document(document):
+    """Validates a declarative input (the contents of a json or yaml file) and makes a TimetableInput from it
+
+    Format (days and hours can be given by name or by number, hours by number):
+        days: [M, T, W, Th, F]
+        hours_per_day: 6
+        classes: [A, B, C]
+        professors:
+          - name: Maria                        optional
+            hours: {A: 3, C: 2}                hours per week for every class the professor teaches
+            max_hours_per_day: {A: 2}          optional, by default all the hours can be on the same day
+            preferred_days: [M, 2]             optional, like days_to_avoid, preferred_hours and hours_to_avoid
+            unavailable: [[M, 0], [W, 5]]      optional, (day, hour) pairs
+    All the problems found are reported together in a ValueError."""
+    errors = []
+
+    def index(value, names, what):
+        """The number of a day, hour or class given by name or by number, None if it does not exist"""
+        if isinstance(value, str) and value in names:
+            return names.index(value)
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            number = -1
+        if 0 <= number < len(names):
+            return number
+        errors.append(f"unknown {what} {value!r}")
+        return None
+
+    def count(value, what):
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            number = -1
+        if number < 0 or number != value and str(number) != str(value).strip():
+            errors.append(f"{what} must be a whole number >= 0, not {value!r}")
+            return 0
+        return number
+
+    if not isinstance(document, dict):
+        raise ValueError("The input must be a mapping with the keys days, hours_per_day, classes and professors")
+    for key in ["days", "hours_per_day", "classes", "professors"]:
+        if key not in document:
+            errors.append(f"missing {key}")
+    if errors:
+        raise ValueError("Invalid timetable input:\n- " + "\n- ".join(errors))
+
+    days = [str(day) for day in document["days"]]
+    classes = [str(name) for name in document["classes"]]
+    number_of_hours = count(document["hours_per_day"], "hours_per_day")
+    hours = [str(h) for h in range(number_of_hours)]
+    for what, names in [("day", days), ("class", classes)]:
+        if len(set(names)) != len(names):
+            errors.append(f"every {what} needs a different name")
+    if len(days) == 0 or number_of_hours == 0:
+        errors.append("there must be at least one day and one hour per day")
+
+    professors = document["professors"]
+    P, C, D, H = len(professors), len(classes), len(days), number_of_hours
+    required_hours = np.zeros((P, C), dtype=np.int64)
+    max_hours_per_day = np.zeros((P, C), dtype=np.int64)
+    available = np.ones((P, D, H), dtype=bool)
+    preferences = {name: [] for name in ["preferred_days", "days_to_avoid", "preferred_hours", "hours_to_avoid"]}
+    names = []
+    for i, professor in enumerate(professors):
+        names.append(str(professor.get("name", i)))
+        for name, c_hours in (professor.get("hours") or {}).items():
+            c = index(name, classes, f"class of professor {names[-1]}:")
+            if c is not None:
+                required_hours[i, c] = count(c_hours, f"hours of professor {names[-1]} for class {name}")
+        max_hours_per_day[i] = required_hours[i] # No limit per day unless one is given
+        for name, c_hours in (professor.get("max_hours_per_day") or {}).items():
+            c = index(name, classes, f"class of professor {names[-1]}:")
+            if c is not None:
+                max_hours_per_day[i, c] = count(c_hours, f"max_hours_per_day of professor {names[-1]} for class {name}")
+        for name in preferences:
+            what, values = ("day" if "days" in name else "hour"), professor.get(name) or []
+            found = [index(value, days if what == "day" else hours, f"{what} in {name} of professor {names[-1]}:") for value in values]
+            preferences[name].append([value for value in found if value is not None])
+        for pair in professor.get("unavailable") or []:
+            if len(pair) != 2:
+                errors.append(f"unavailable hours of professor {names[-1]} must be [day, hour] pairs, not {pair!r}")
+                continue
+            d = index(pair[0], days, f"unavailable day of professor {names[-1]}:")
+            h = index(pair[1], hours, f"unavailable hour of professor {names[-1]}:")
+            if d is not None and h is not None:
+                available[i, d, h] = False
+    if len(set(names)) != len(names):
+        errors.append("every professor needs a different name")
+    if errors:
+        raise ValueError("Invalid timetable input:\n- " + "\n- ".join(errors))
+
+    return TimetableInput(classes, days, number_of_hours, required_hours, max_hours_per_day, available,
+                          preferences["preferred_days"], preferences["days_to_avoid"],
+                          preferences["preferred_hours"], preferences["hours_to_avoid"], names)
+
+
+def read_document(path):
+    """Reads a json or yaml file (yaml needs the pyyaml package)"""
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def read_csv(directory):
+    """Reads an input from a directory of csv files and returns it in the format of from_document
+
+    days.csv         day,hours                (one row per day, every day has the same number of hours)
+    classes.csv      class
+    professors.csv   professor,preferred_days,days_to_avoid,preferred_hours,hours_to_avoid   (lists separated by spaces)
+    lessons.csv      professor,class,hours,max_hours_per_day   (max_hours_per_day can be empty)
+    unavailable.csv  professor,day,hour       (optional)"""
+    def rows(name):
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            return []
+        with open(path, newline="") as f:
+            return [{key.strip(): (value or "").strip() for key, value in row.items()} for row in csv.DictReader(f)]
+
+    days = rows("days.csv")
+    if len({row["hours"] for row in days}) > 1:
+        raise ValueError("Invalid timetable input:\n- every day in days.csv must have the same number of hours")
+    document = {
+        "days": [row["day"] for row in days],
+        "hours_per_day": days[0]["hours"] if days else 0,
+        "classes": [row["class"] for row in rows("classes.csv")],
+    }
+    professors = {}
+    for row in rows("professors.csv"):
+        professors[row["professor"]] = {"name": row["professor"], "hours": {}, "max_hours_per_day": {}, "unavailable": []}
+        for name in ["preferred_days", "days_to_avoid", "preferred_hours", "hours_to_avoid"]:
+            professors[row["professor"]][name] = row.get(name, "").split()
+    for row in rows("lessons.csv"):
+        professor = professors.setdefault(row["professor"], {"name": row["professor"], "hours": {}, "max_hours_per_day": {}, "unavailable": []})
+        professor["hours"][row["class"]] = row["hours"]
+        if row.get("max_hours_per_day"):
+            professor["max_hours_per_day"][row["class"]] = row["max_hours_per_day"]
+    for row in rows("unavailable.csv"):
+        if row["professor"] not in professors:
+            raise ValueError(f"Invalid timetable input:\n- unknown professor {row['professor']!r} in unavailable.csv")
+        professors[row["professor"]]["unavailable"].append([row["day"], row["hour"]])
+    document["professors"] = list(professors.values())
+    return document
+
+
+def load_npz(path, mmap=True):
+    """Reads an input compiled with TimetableInput.save
+
+    With mmap the arrays are memory-mapped read-only from the file instead of being read, so only the parts
+    that are used are read from the disk. np.load cannot memory-map the arrays of a .npz file, but they are
+    stored without compression, so every array is mapped at its offset in the file."""
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            name = info.filename[:-len(".npy")]
+            if mmap and info.compress_type == zipfile.ZIP_STORED:
+                # The data of a member starts after its local header (30 bytes, the file name and the extra field)
+                f.seek(info.header_offset + 26)
+                name_length, extra_length = struct.unpack("<HH", f.read(4))
+                f.seek(info.header_offset + 30 + name_length + extra_length)
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0):
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+                else:
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+                if not dtype.hasobject and int(np.prod(shape)) > 0:
+                    arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape, order="F" if fortran_order else "C")
+                    continue
+            with archive.open(info) as member:
+                arrays[name] = np.lib.format.read_array(member)
+
+    def lists(name):
+        values, offsets = arrays[name].tolist(), arrays[name + "_offsets"].tolist()
+        return [values[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    return TimetableInput(arrays["class_names"].tolist(), arrays["days_initials"].tolist(), int(arrays["number_of_hours"]),
+                          arrays["required_hours"], arrays["max_hours_per_day"], arrays["available"],
+                          *[lists(name) for name in preference_fields], arrays["professor_names"].tolist())
+
+
+def source_time(path):
+    """The time of the last change of an input file, or of any file of an input directory"""
+    if os.path.isdir(path):
+        return max([os.path.getmtime(os.path.join(path, name)) for name in os.listdir(path)] + [os.path.getmtime(path)])
+    return os.path.getmtime(path)
+
+
+def load(source, mmap=True):
+    """Returns the TimetableInput of source: an input module (or object), or the path of a .npz, json, yaml or csv input
+
+    json, yaml and csv inputs are compiled to source + ".npz" the first time, and that file is used as long as
+    it is newer than the source."""
+    if not isinstance(source, (str, os.PathLike)):
+        return from_module(source)
+    source = os.fspath(source).rstrip("/")
+    if source.endswith(".npz"):
+        return load_npz(source, mmap)
+
+    compiled = source + ".npz"
+    if os.path.exists(compiled) and os.path.getmtime(compiled) >= source_time(source):
+        return load_npz(compiled, mmap)
+    inp = from_document(read_csv(source) if os.path.isdir(source) else read_document(source))
+    try:
+        inp.save(compiled)
+    except OSError: # e.g. the directory is read-only, the input is used without compiling it
+        pass
+    return inp
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    source = sys.argv[1]
+    if os.path.exists(source):
+        inp = from_document(read_csv(source) if os.path.isdir(source) else read_document(source))
+    else: # The name of an input module
+        import importlib
+        inp = from_module(importlib.import_module(source))
+    output = sys.argv[2] if len(sys.argv) > 2 else source.rstrip("/") + ".npz"
+    inp.save(output)
+    print(f"{inp.number_of_professors} professors, {inp.number_of_classes} classes, "
+          f"{inp.number_of_days} days with {inp.number_of_hours} hours: saved to {output}")
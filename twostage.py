@@ -0,0 +1,250 @@
+"""Solves a timetable in two stages: first the hours of every professor and class on every day, then every day alone
+
+Most of the model only depends on the days: the weekly hours, the hours per day and the preferred and avoided days.
+Stage one decides y[i, d, c], the hours professor i teaches class c on day d, with a model that has one variable
+per (professor, day, class) instead of one per hour:
+    sum(y[i, d, c] for d) <= required hours of (i, c)                 (== for a complete timetable)
+    sum(y[i, d, c] for c) <= the hours professor i can teach on day d
+    sum(y[i, d, c] for i) <= the hours class c can be taught on day d
+    y[i, d, c] <= the daily limit and the available hours of (i, c) on day d
+Stage two places the lessons of every day at its hours (no clashes, only available hours, the preferred hours)
+as a Timetable of one day, and the days are solved in parallel processes.
+
+If the lessons of a day do not all fit, the pairs (i, c) whose hours v[i, c] do not fit together are searched
+(removing the classes, and then the pairs, whose lessons are not needed for the conflict, see day_conflict).
+More hours for all of these pairs do not fit either, so stage one gets a cut that asks for fewer hours of at
+least one of them on that day, with a binary z per pair:
+    y[i, d, c] <= v[i, c] - 1 for some pair with z[i, c] = 1,      sum(z) >= 1
+and it is solved again. In tight timetables there can be too many such conflicts, so after max_rounds a day that
+still does not fit is solved together with one other day (an lns.py neighborhood of 2 days), which can take some
+of its lessons. The hour preferences are only in stage two, so the result is good but not proven optimal.
+
+    result = twostage.solve(timetable, workers=4)
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import lns
+import presolve
+import solvers
+import timetable_input
+import verify
+
+
+class DayModel:
+    """The model of stage one, with the attributes of a Timetable that the solver backends use
+
+    Row j of keys is the (professor, day, class) of column j, upper its bound and objective its coefficient.
+    The columns after them are the binaries of the cuts."""
+
+    def __init__(self, inp, params, extra_priority, complete=False):
+        self.inp = inp
+        D, C = inp.number_of_days, inp.number_of_classes
+        professor_day, day_class, pair_day, _ = presolve.capacities(inp)
+        self.keys = np.argwhere(pair_day > 0)
+        self.upper = pair_day[tuple(self.keys.T)].astype(np.int64)
+        self.number_of_columns = len(self.keys)
+        i, d, c = self.keys.T
+
+        # Only the terms that depend on the days, the hours are chosen in stage two
+        priority = np.asarray(extra_priority, dtype=float)
+        masks = timetable_input.preference_masks(inp)
+        self.objective = (params["coverage"] + priority[i]*(params["preferred_days"]*masks["preferred_days"][i, d]
+                                                            - params["avoidance_days"]*masks["avoidance_days"][i, d]))
+
+        required_hours = np.asarray(inp.required_hours_per_professor_per_class).ravel().astype(float)
+        self.matrix_rows, self.matrix_cols, self.matrix_vals, self.row_lower, self.row_upper = [], [], [], [], []
+        self.number_of_rows = 0
+        for group, upper, lower in [(i*C + c, required_hours, required_hours if complete else None),
+                                    (i*D + d, professor_day.ravel().astype(float), None),
+                                    (d*C + c, day_class.ravel().astype(float), None)]:
+            groups, rows = np.unique(group, return_inverse=True)
+            self.append_rows(self.number_of_rows + rows, np.arange(len(self.keys)), np.ones(len(self.keys)),
+                             np.full(len(groups), -np.inf) if lower is None else lower[groups], upper[groups])
+
+    def append_rows(self, rows, cols, vals, lower, upper):
+        self.matrix_rows.append(rows)
+        self.matrix_cols.append(cols)
+        self.matrix_vals.append(vals)
+        self.row_lower.append(lower)
+        self.row_upper.append(upper)
+        self.number_of_rows += len(lower)
+
+    def constraint_matrix(self):
+        return tuple(np.concatenate(blocks) for blocks in [self.matrix_rows, self.matrix_cols, self.matrix_vals, self.row_lower, self.row_upper])
+
+    def columns(self, d, pairs):
+        """The columns of the pairs (i, c) of the bool (professors x classes) array pairs on day d"""
+        i, day, c = self.keys.T
+        return np.flatnonzero((day == d) & pairs[i, c])
+
+    def add_cut(self, backend, cols, hours):
+        """Adds the cut that forbids y[cols] >= hours (every one of them) to the model and to the backend"""
+        n = len(cols)
+        binaries = np.arange(self.number_of_columns, self.number_of_columns + n)
+        self.number_of_columns += n
+        backend.add_columns(np.full((n, 3), -1), np.ones(n, dtype=np.int64), np.zeros(n), np.zeros(0, dtype=np.int64),
+                            np.zeros(0, dtype=np.int64), np.zeros(0))
+
+        # y[j] + (upper[j] - hours[j] + 1)*z[j] <= upper[j], so z[j] = 1 means y[j] <= hours[j] - 1
+        first = self.number_of_rows
+        self.append_rows(np.repeat(np.arange(first, first + n), 2), np.stack([cols, binaries], axis=1).ravel(),
+                         np.stack([np.ones(n), self.upper[cols] - hours + 1], axis=1).ravel().astype(float),
+                         np.full(n, -np.inf), self.upper[cols].astype(float))
+        self.append_rows(np.full(n, first + n), binaries, np.ones(n), np.ones(1), np.full(1, np.inf))
+        rows, cols, vals, lower, upper = self.constraint_matrix()
+        for row in range(first, self.number_of_rows):
+            in_row = rows == row
+            backend.add_row(row, cols[in_row], vals[in_row], lower[row], upper[row])
+
+    def variable_name(self, j):
+        if j >= len(self.keys):
+            return f"Z_{j}"
+        return "Y_" + "_".join(map(str, self.keys[j].tolist()))
+
+
+def day_input(inp, d, hours):
+    """Returns the input of day d alone, where every professor has to teach every class the hours of hours (P x C)"""
+    return timetable_input.TimetableInput(
+        inp.class_names, [inp.days_initials[d]], inp.number_of_hours, hours, hours, inp.available[:, [d], :],
+        [[0] if d in days else [] for days in inp.preferred_days_per_professor],
+        [[0] if d in days else [] for days in inp.days_to_avoid_per_professor],
+        inp.preferred_hours_per_professor, inp.hours_to_avoid_per_professor, inp.professor_names)
+
+
+def day_conflict(inp, d, hours, backend, time_limit):
+    """Returns a (professors x classes) bool array of pairs whose hours on day d do not fit together, as few as found,
+    or None if the hours fit (runs in a worker process)
+
+    Starting from every pair, the classes and then the pairs that are not needed for the conflict are left out
+    one at a time. A check that reaches time_limit counts as fitting, so the pairs left are always a conflict."""
+    import main
+
+    def fits(pairs):
+        timetable = main.Timetable(day_input(inp, d, np.where(pairs, hours, 0)), complete=True, backend=backend, build=False)
+        return timetable.solve(time_limit=time_limit).status != "infeasible"
+
+    pairs = hours > 0
+    if fits(pairs):
+        return None
+    for c in np.flatnonzero(pairs.any(axis=0)).tolist():
+        trial = pairs.copy()
+        trial[:, c] = False
+        if trial.any() and not fits(trial):
+            pairs = trial
+    for i, c in np.argwhere(pairs).tolist():
+        trial = pairs.copy()
+        trial[i, c] = False
+        if trial.any() and not fits(trial):
+            pairs = trial
+    return pairs
+
+
+def solve(timetable, workers=None, stage_time=60, day_time=10, max_rounds=10, backend=None):
+    """Solves the timetable in two stages, in up to workers processes, and sets the timetable found as its solution
+
+    stage_time: time limit of every solve of stage one, day_time of every day of stage two (and of every check
+    of day_conflict)
+    max_rounds: number of times stage one is solved at most; the days that still do not fit then are solved with
+    another day (in 2*day_time), and if some lessons still do not fit a complete timetable has the status "no solution"
+    Prints the size of the models and the result of every round. Returns a solvers.SolveResult."""
+    started = time.perf_counter()
+    if timetable.backend is None: # Only the variables and the objective are needed, not the whole model
+        timetable.presolve()
+        timetable.create_timetable()
+        timetable.create_unavailable_hours_constraints() # In dense mode the unusable variables are only fixed to 0 here
+        timetable.set_objective()
+    if timetable.presolve_infeasible():
+        return timetable.result
+
+    inp = timetable.inp
+    backend_name = timetable.backend_name if backend is None else backend
+    model = DayModel(inp, timetable.params, timetable.extra_priority, timetable.complete)
+    stage_one = solvers.get_backend(backend_name)
+    stage_one.load(model)
+    print(f"Stage one: {len(model.keys)} variables and {model.number_of_rows} rows "
+          f"(the whole model has {len(timetable.keys)} variables)")
+
+    options = {"sparse": True, "backend": backend_name, "complete": False}
+    no_blocked = np.zeros((1, inp.number_of_hours, inp.number_of_classes), dtype=bool)
+    workers = os.cpu_count() if workers is None else workers
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and inp.number_of_days > 1 else None
+
+    def run(function, tasks):
+        if executor is None or len(tasks) == 0:
+            return [function(*task) for task in tasks]
+        return list(executor.map(function, *zip(*tasks)))
+
+    lessons = []
+    try:
+        for round_number in range(1, max_rounds + 1):
+            result = stage_one.solve(time_limit=stage_time)
+            if result.status not in ("optimal", "feasible"):
+                timetable.result = solvers.SolveResult(result.status, time=time.perf_counter() - started)
+                timetable.set_solution(None)
+                return timetable.result
+            hours = np.zeros((inp.number_of_professors, inp.number_of_days, inp.number_of_classes), dtype=np.int64)
+            hours[tuple(model.keys.T)] = np.round(result.values[:len(model.keys)]).astype(np.int64)
+
+            # A day without lessons already fits, and its model would have no columns
+            days = [d for d in range(inp.number_of_days) if hours[:, d, :].sum() > 0]
+            outputs = run(lns.solve_neighborhood, [(day_input(inp, d, hours[:, d, :]), options, timetable.params, timetable.extra_priority,
+                                                    no_blocked, np.zeros((0, 4), dtype=np.int64), day_time) for d in days])
+            lessons = [(i, d, h, c) for d, (_, assignments) in zip(days, outputs) for i, _, h, c in assignments]
+            short = [d for d, (_, assignments) in zip(days, outputs) if len(assignments) < hours[:, d, :].sum()]
+            print(f"Round {round_number}: stage one {result.status} ({result.time:.2f}s), "
+                  f"{inp.number_of_days - len(short)} of {inp.number_of_days} days fit")
+            if len(short) == 0 or round_number == max_rounds:
+                break
+
+            # Feedback: stage one has to give fewer hours to one of the pairs of every conflict
+            conflicts = run(day_conflict, [(inp, d, hours[:, d, :], backend_name, day_time) for d in short])
+            for d, pairs in zip(short, conflicts):
+                if pairs is None:
+                    continue
+                cols = model.columns(d, pairs)
+                model.add_cut(stage_one, cols, hours[tuple(model.keys[cols].T)])
+                print(f"Cut for {inp.days_initials[d]}: {len(cols)} pairs of professors and classes")
+            if all(pairs is None for pairs in conflicts): # The days only reached the time limit
+                break
+
+        # Repair: a day that still does not fit is solved again together with each other day, which can take some
+        # of its lessons, and the best of these timetables is kept
+        for d in short:
+            current = np.array(lessons, dtype=np.int64).reshape(-1, 4)
+            neighborhoods = [(list(range(inp.number_of_professors)), sorted([d, e]), list(range(inp.number_of_classes)))
+                             for e in range(inp.number_of_days) if e != d]
+            tasks = []
+            for neighborhood in neighborhoods:
+                sub_input, blocked, sub_start = lns.neighborhood_input(inp, current, neighborhood)
+                # A complete sub timetable cannot start from the lessons that did not all fit
+                tasks.append((sub_input, dict(options, complete=timetable.complete), timetable.params, timetable.extra_priority,
+                              blocked, sub_start[:0] if timetable.complete else sub_start, 2*day_time))
+            best = (len(current), verify.score(inp, current, timetable.params, timetable.extra_priority)[0])
+            for (_, days, _), (result, assignments) in zip(neighborhoods, run(lns.solve_neighborhood, tasks)):
+                if result.status not in ("optimal", "feasible"):
+                    continue
+                merged = np.array(assignments, dtype=np.int64).reshape(-1, 4)
+                merged[:, 1] = np.asarray(days)[merged[:, 1]]
+                candidate = np.concatenate([current[~np.isin(current[:, 1], days)], merged])
+                report = verify.check(inp, candidate, timetable.params, timetable.extra_priority, details=False)
+                if report["feasible"] and (len(candidate), report["objective"]) > best:
+                    best, lessons = (len(candidate), report["objective"]), candidate.tolist()
+            print(f"Repair of {inp.days_initials[d]}: {best[0] - len(current)} more lessons")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    values = np.zeros(len(timetable.keys))
+    values[[timetable.column(key) for key in lessons]] = 1
+    if timetable.complete and len(lessons) < np.sum(inp.required_hours_per_professor_per_class):
+        timetable.result = solvers.SolveResult("no solution", time=time.perf_counter() - started)
+        timetable.set_solution(None)
+    else:
+        objective, _ = verify.score(inp, lessons, timetable.params, timetable.extra_priority)
+        timetable.result = solvers.SolveResult("feasible", objective, None, time.perf_counter() - started, values)
+        timetable.set_solution(timetable.keys[values > 0.5])
+    return timetable.result
@@ -0,0 +1,148 @@
+"""Checks a timetable against the rules of the model and computes its objective, without the model or the solver
+
+A timetable is an array of assignments (professor, day, hour, class), e.g. Timetable.assignments(), a timetable
+saved with Timetable.save_timetable, one from the cache, the heuristic or an import. Every rule of main.Timetable
+is checked with a few NumPy operations on the whole timetable, so checking one takes about a millisecond:
+    - "professor_slot": a professor teaches 2 classes at the same hour
+    - "class_slot": a class is taught by 2 professors at the same hour
+    - "coverage": a professor teaches a class more hours than required (or fewer, for a complete timetable)
+    - "max_hours_per_day": a professor teaches a class more hours on a day than allowed
+    - "unavailable": a professor teaches at an hour at which they are unavailable
+    - "range": the assignment is not a professor, day, hour and class of the input (it is not checked further)
+
+    report = verify.check(inp, assignments, timetable.params, timetable.extra_priority)
+    report["feasible"], report["violations"], report["objective"]
+
+Usage:
+    python verify.py timetable.json [input] [--complete]     (input_data_real by default)
+"""
+import argparse
+import importlib
+import json
+import os
+
+import numpy as np
+
+import presolve
+import timetable_input
+
+
+constraints = ["range", "professor_slot", "class_slot", "coverage", "max_hours_per_day", "unavailable"]
+
+
+def counts(inp, assignments):
+    """Returns (grid, outside): how many times every (i, d, h, c) is assigned as a (professors x days x hours x classes)
+    array, and the assignments that are not in the timetable"""
+    assignments = np.asarray(assignments, dtype=np.int64).reshape(-1, 4)
+    shape = (inp.number_of_professors, inp.number_of_days, inp.number_of_hours, inp.number_of_classes)
+    inside = ((assignments >= 0) & (assignments < shape)).all(axis=1)
+    flat = np.ravel_multi_index(tuple(assignments[inside].T), shape)
+    return np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape), assignments[~inside]
+
+
+def score(inp, assignments, params, extra_priority):
+    """Returns the objective of Timetable.set_objective for the assignments and the value of every term, unweighted
+
+    params and extra_priority are those of the Timetable (timetable.params, timetable.extra_priority)."""
+    grid, _ = counts(inp, assignments)
+    per_day = grid.sum(axis=(2, 3)) # professors x days
+    per_hour = grid.sum(axis=(1, 3)) # professors x hours
+    priority = np.asarray(extra_priority, dtype=float)[:, np.newaxis]
+    masks = timetable_input.preference_masks(inp)
+    terms = {
+        "coverage": float(grid.sum()),
+        "preferred_days": float((priority*masks["preferred_days"]*per_day).sum()),
+        "avoidance_days": -float((priority*masks["avoidance_days"]*per_day).sum()),
+        "preferred_hours": float((priority*masks["preferred_hours"]*per_hour).sum()),
+        "avoidance_hours": -float((priority*masks["avoidance_hours"]*per_hour).sum()),
+    }
+    return sum(params[name]*value for name, value in terms.items()), terms
+
+
+def check(inp, assignments, params=None, extra_priority=None, complete=False, details=True):
+    """Checks the assignments (i, d, h, c) against every rule of the model and returns a report dict:
+
+    feasible: True if no rule is broken
+    violations: {constraint: number of rows of the model that are broken}, for every constraint of the module docstring
+    problems: one dict per broken row like the problems of presolve.py (constraint, professor, class, day, hour, message),
+    only with details=True (making the messages is the slow part when checking many timetables)
+    objective, terms: see score, only if params and extra_priority are given
+    complete: the required hours have to be taught exactly, as in Timetable(complete=True)"""
+    required_hours = np.asarray(inp.required_hours_per_professor_per_class)
+    max_hours = np.asarray(inp.max_hours_per_professor_per_class_per_day)
+    grid, outside = counts(inp, assignments)
+
+    broken = {
+        "professor_slot": np.argwhere(grid.sum(axis=3) > 1), # i, d, h
+        "class_slot": np.argwhere(grid.sum(axis=0) > 1), # d, h, c
+        "coverage": np.argwhere(grid.sum(axis=(1, 2)) != required_hours if complete else grid.sum(axis=(1, 2)) > required_hours), # i, c
+        "max_hours_per_day": np.argwhere(grid.sum(axis=2) > max_hours[:, np.newaxis, :]), # i, d, c
+        "unavailable": np.argwhere((grid.sum(axis=3) > 0) & ~np.asarray(inp.available, dtype=bool)), # i, d, h
+    }
+    report = {"violations": {"range": len(outside)}}
+    report["violations"].update({name: len(rows) for name, rows in broken.items()})
+    report["feasible"] = sum(report["violations"].values()) == 0
+
+    if details:
+        names = inp.class_names
+        problems = [presolve.problem("range", f"Assignment {tuple(key)} is not in the timetable") for key in outside.tolist()]
+        for i, d, h in broken["professor_slot"].tolist():
+            classes = ", ".join(names[c] for c in np.flatnonzero(grid[i, d, h]).tolist())
+            problems.append(presolve.problem("professor_slot", f"Professor {i} teaches {grid[i, d, h].sum()} lessons (classes {classes}) "
+                                                               f"at {presolve.slot_name(inp, d, h)}",
+                                             professor=i, day=d, hour=h))
+        for d, h, c in broken["class_slot"].tolist():
+            professors = ", ".join(map(str, np.flatnonzero(grid[:, d, h, c]).tolist()))
+            problems.append(presolve.problem("class_slot", f"Class {names[c]} has {grid[:, d, h, c].sum()} lessons (professors {professors}) "
+                                                           f"at {presolve.slot_name(inp, d, h)}",
+                                             class_=c, day=d, hour=h))
+        for i, c in broken["coverage"].tolist():
+            problems.append(presolve.problem("coverage", f"Professor {i} teaches class {names[c]} {grid[i, :, :, c].sum()} hours "
+                                                         f"but has to teach it {required_hours[i, c]}", professor=i, class_=c))
+        for i, d, c in broken["max_hours_per_day"].tolist():
+            problems.append(presolve.problem("max_hours_per_day", f"Professor {i} teaches class {names[c]} {grid[i, d, :, c].sum()} hours "
+                                                                  f"on {inp.days_initials[d]} but at most {max_hours[i, c]} per day",
+                                             professor=i, class_=c, day=d))
+        for i, d, h in broken["unavailable"].tolist():
+            problems.append(presolve.problem("unavailable", f"Professor {i} teaches at {presolve.slot_name(inp, d, h)} but is unavailable",
+                                             professor=i, day=d, hour=h))
+        report["problems"] = problems
+
+    if params is not None and extra_priority is not None:
+        report["objective"], report["terms"] = score(inp, assignments, params, extra_priority)
+    return report
+
+
+def check_timetable(timetable, assignments=None, details=True):
+    """check() with the input, the weights and the mode of a Timetable, for its solution by default"""
+    if assignments is None:
+        assignments = np.zeros((0, 4), dtype=np.int64) if timetable.solution is None else timetable.solution
+    return check(timetable.inp, assignments, timetable.params, timetable.extra_priority, timetable.complete, details)
+
+
+def print_report(report):
+    for problem in report.get("problems", []):
+        print(f"[{problem['constraint']}] {problem['message']}")
+    print("Feasible" if report["feasible"] else "Not feasible")
+    print("\t".join(f"{name}: {report['violations'][name]}" for name in constraints))
+    if "objective" in report:
+        print(f"Objective: {report['objective']}")
+
+
+if __name__ == '__main__':
+    import main # main is not imported at the top, so that it can use this module
+
+    parser = argparse.ArgumentParser(description="Checks a timetable saved with Timetable.save_timetable")
+    parser.add_argument("timetable", help="json file with the assignments")
+    parser.add_argument("input", nargs="?", default="input_data_real", help="input module or input file")
+    parser.add_argument("--complete", action="store_true", help="every required hour has to be taught")
+    args = parser.parse_args()
+
+    if os.path.exists(args.input):
+        inp = timetable_input.load(args.input)
+    else:
+        inp = timetable_input.from_module(importlib.import_module(args.input))
+    with open(args.timetable) as f:
+        assignments = json.load(f)["assignments"]
+    timetable = main.Timetable(inp, complete=args.complete, build=False) # Only for the weights of the objective
+    print_report(check_timetable(timetable, assignments))